@@ -0,0 +1,165 @@
+# Batched versions of the heuristics and evaluation functions in minimax.py, using NumPy. Instead of one
+# list-of-lists board at a time these score a whole array of positions in one go. That only pays off for large batches
+# (a few dozen positions or more; below about 30 it is slower than scoring the boards one by one), so these are for
+# offline work such as scoring data sets or tuning weights, not for the children of a node during a search.
+#
+# Positions are an (N, 8, 8) int8 array indexed [n, x, y] like board[x][y], holding WHITE (1), BLACK (-1) or EMPTY (0).
+# Use boardsToArray or bitboardsToArray to build one. Every function returns an array of N float64 scores, equal up to
+# float rounding to what the function of the same name in minimax.py gives for each position.
+
+import numpy as np
+from board_functions import WHITE_TILE, BLACK_TILE
+
+WHITE = 1
+BLACK = -1
+EMPTY = 0
+
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+
+CORNERS = [(0, 0), (0, 7), (7, 0), (7, 7)]
+# Each corner with the three squares next to it, as used by cornerCloseness.
+CORNER_NEIGHBOURS = [((0, 0), [(0, 1), (1, 0), (1, 1)]),
+                     ((0, 7), [(0, 6), (1, 6), (1, 7)]),
+                     ((7, 0), [(7, 1), (6, 0), (6, 1)]),
+                     ((7, 7), [(7, 6), (6, 6), (6, 7)])]
+
+def buildFrontierMasks():
+    # For each direction, marks the squares whose neighbour in that direction is looked at by potentialMobility:
+    # all 8 neighbours for the 4x4 interior, left and right for the rest of rows 1 and 6, up and down for the rest of
+    # columns 1 and 6.
+    masks = np.zeros((len(DIRECTIONS), 8, 8), dtype=np.int32)
+    for d, (dx, dy) in enumerate(DIRECTIONS):
+        for x in range(2, 6):
+            for y in range(2, 6):
+                masks[d, x, y] = 1
+        if dx == 0:
+            for y in range(2, 6):
+                masks[d, 1, y] = 1
+                masks[d, 6, y] = 1
+        if dy == 0:
+            for x in range(2, 6):
+                masks[d, x, 1] = 1
+                masks[d, x, 6] = 1
+    return masks
+
+FRONTIER_MASKS = buildFrontierMasks()
+
+def boardsToArray(boards):
+    # Converts a list of list-of-lists boards into an (N, 8, 8) int8 array.
+    values = {WHITE_TILE: WHITE, BLACK_TILE: BLACK}
+    return np.array([[[values.get(space, EMPTY) for space in column] for column in board] for board in boards],
+                    dtype=np.int8).reshape(len(boards), 8, 8)
+
+def bitboardsToArray(bitboards):
+    # Converts a list of (white, black) bitboard pairs (see board_functions.boardToBitboards) into an (N, 8, 8) array.
+    pairs = np.array(bitboards, dtype=np.uint64).reshape(len(bitboards), 2)
+    bits = np.arange(64, dtype=np.uint64)
+    white = ((pairs[:, 0:1] >> bits) & np.uint64(1)).astype(np.int8)
+    black = ((pairs[:, 1:2] >> bits) & np.uint64(1)).astype(np.int8)
+    return (white - black).reshape(len(bitboards), 8, 8)
+
+def shift(array, dx, dy):
+    # Moves every square's value by (dx, dy) along the last two axes, filling with zeros instead of wrapping round.
+    result = np.zeros_like(array)
+    xFrom = slice(max(0, -dx), 8 - max(0, dx))
+    xTo = slice(max(0, dx), 8 - max(0, -dx))
+    yFrom = slice(max(0, -dy), 8 - max(0, dy))
+    yTo = slice(max(0, dy), 8 - max(0, -dy))
+    result[..., xTo, yTo] = array[..., xFrom, yFrom]
+    return result
+
+def validMoveMasks(own, opp):
+    # Boolean (N, 8, 8) array of the legal moves for the player with discs 'own' against 'opp' (boolean arrays).
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for dx, dy in DIRECTIONS:
+        run = opp & shift(own, dx, dy)
+        for i in range(5):
+            run |= opp & shift(run, dx, dy)
+        moves |= empty & shift(run, dx, dy)
+    return moves
+
+def ratio(white, black):
+    # The 100*(white - black)/(white + black + 1) normalisation used by all the heuristics.
+    white = white.astype(np.float64)
+    black = black.astype(np.float64)
+    return 100*(white - black)/(white + black + 1)
+
+def cornerOccupancy(boards):
+    corners = np.stack([boards[:, x, y] for x, y in CORNERS], axis=1)
+    return ratio((corners == WHITE).sum(axis=1), (corners == BLACK).sum(axis=1))
+
+def cornerCloseness(boards):
+    whiteTiles = np.zeros(len(boards), dtype=np.int32)
+    blackTiles = np.zeros(len(boards), dtype=np.int32)
+    for (cx, cy), neighbours in CORNER_NEIGHBOURS:
+        cornerEmpty = boards[:, cx, cy] == EMPTY
+        for x, y in neighbours:
+            whiteTiles += cornerEmpty & (boards[:, x, y] == WHITE)
+            blackTiles += cornerEmpty & (boards[:, x, y] == BLACK)
+    return -ratio(whiteTiles, blackTiles)
+
+def actualMobility(boards):
+    white = boards == WHITE
+    black = boards == BLACK
+    numWhiteMoves = validMoveMasks(white, black).sum(axis=(1, 2))
+    numBlackMoves = validMoveMasks(black, white).sum(axis=(1, 2))
+    return ratio(numWhiteMoves, numBlackMoves)
+
+def potentialMobility(boards):
+    empty = (boards == EMPTY).astype(np.int32)
+    emptyNeighbours = np.zeros(boards.shape, dtype=np.int32)
+    for d, (dx, dy) in enumerate(DIRECTIONS):
+        # shift by minus the direction puts the neighbour at (x+dx, y+dy) onto (x, y)
+        emptyNeighbours += FRONTIER_MASKS[d] * shift(empty, -dx, -dy)
+    # Empty squares next to white discs are potential moves for black, and the other way round.
+    whiteMobility = (emptyNeighbours * (boards == BLACK)).sum(axis=(1, 2))
+    blackMobility = (emptyNeighbours * (boards == WHITE)).sum(axis=(1, 2))
+    return ratio(whiteMobility, blackMobility)
+
+def discDifference(boards):
+    return ratio((boards == WHITE).sum(axis=(1, 2)), (boards == BLACK).sum(axis=(1, 2)))
+
+def stableFromCorner(isColour, flipRows, flipColumns):
+    # Counts discs the same way as one corner scan of minimax.stability: walk along the edge row from the corner while
+    # the squares are this colour, and for each of those columns count the run of this colour from the edge.
+    if flipRows:
+        isColour = isColour[:, ::-1, :]
+    if flipColumns:
+        isColour = isColour[:, :, ::-1]
+    edgeRun = np.cumprod(isColour[:, 0, :], axis=1) # 1 while still in the run along the edge row
+    columnRuns = np.cumprod(isColour, axis=1).sum(axis=1) # length of the run down each column
+    return (edgeRun * columnRuns).sum(axis=1)
+
+def stability(boards):
+    whiteStableDiscs = np.zeros(len(boards), dtype=np.int64)
+    blackStableDiscs = np.zeros(len(boards), dtype=np.int64)
+    isWhite = (boards == WHITE).astype(np.int64)
+    isBlack = (boards == BLACK).astype(np.int64)
+    for flipRows in (False, True):
+        for flipColumns in (False, True):
+            whiteStableDiscs += stableFromCorner(isWhite, flipRows, flipColumns)
+            blackStableDiscs += stableFromCorner(isBlack, flipRows, flipColumns)
+    return ratio(whiteStableDiscs, blackStableDiscs)
+
+def evaluation2(boards):
+    CO = cornerOccupancy(boards)
+    CC = cornerCloseness(boards)
+    AM = actualMobility(boards)
+    PM = potentialMobility(boards)
+    DD = discDifference(boards)
+    S = stability(boards)
+    return 800*CO + 400*CC + 20*AM + 20*PM + 10*DD + 500*S
+
+def evaluation3(boards):
+    numTiles = (boards != EMPTY).sum(axis=(1, 2))
+    CO = cornerOccupancy(boards)
+    CC = cornerCloseness(boards)
+    AM = actualMobility(boards)
+    PM = potentialMobility(boards)
+    DD = discDifference(boards)
+    S = stability(boards)
+    early = 1000*CO + 1000*CC + 20*AM + 10*PM + 1000*S
+    middle = 1000*CO + 1000*CC + 10*AM + 5*PM + 1000*S + 5*DD
+    late = 1000*CO + 1000*CC + 1000*S + 500*DD
+    return np.where(numTiles <= 20, early, np.where(numTiles <= 58, middle, late))
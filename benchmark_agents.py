@@ -0,0 +1,207 @@
+# Latency and throughput of every agent, per game phase, on a fixed corpus of positions (benchmark_positions.json).
+# For each agent and phase it records the time per move (mean, 50th/90th/99th percentile and max), the minimax nodes or
+# MCTS simulations per second, and the peak memory allocated during a move. Results can be saved as a baseline and
+# later runs compared against it. The time compared is the mean over a phase's positions of each position's fastest
+# repeat, which is much steadier than the percentiles of single moves. A phase whose time or peak memory grows by more
+# than --threshold, and by more than --min-change-ms or --min-change-kb, counts as a regression and makes the run exit
+# with status 1. The floors keep sub-millisecond agents from tripping the check on timer noise.
+#
+# Agents are given as in tournament.py (e.g. roxanne3, minimax:evaluation3:2, mcts:100:4:Random).
+#
+# Usage: python benchmark_agents.py [--agents A B ...] [--repeat 5] [--output results.json]
+#                                   [--baseline baseline.json] [--threshold 0.2] [--min-change-ms 0.5]
+#        python benchmark_agents.py --build-corpus   (only when changing the corpus; bump CORPUS_VERSION too)
+
+import argparse, copy, json, os, platform, random, sys, time, tracemalloc
+from board_functions import *
+import minimax, mcts, endgame
+from evaluation_cache import SHARED_EVALUATION_CACHE
+from tournament import makeAgent
+from perft import gitCommit
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_positions.json')
+CORPUS_VERSION = 1
+PHASES = ['opening', 'midgame', 'endgame']
+# Plies at which corpus positions are taken from each game, by phase. The endgame ones include positions with few
+# enough empty squares for the exact endgame solver.
+CORPUS_PLIES = {'opening': [5, 8, 11], 'midgame': [21, 28, 35], 'endgame': [46, 51, 54]}
+
+DEFAULT_AGENTS = ['getComputerMove', 'roxanne3', 'mindisc', 'scorediff',
+                  'minimax:evaluation3:1', 'minimax:evaluation3:2', 'minimax:evaluation3:3', 'minimax:evaluation5:2',
+                  'mcts:50', 'mcts:50:4:Random']
+
+# Changes smaller than these are never counted as regressions, whatever the threshold.
+MIN_TIME_CHANGE_MS = 0.5
+MIN_MEMORY_CHANGE_KB = 64
+
+def buildCorpus(numGames=3, seed=1):
+    # Positions from seeded random games at the plies in CORPUS_PLIES, as in perft.py: 64 characters, X black, O white.
+    rng = random.Random(seed)
+    symbols = {BLACK_TILE: 'X', WHITE_TILE: 'O', EMPTY_SPACE: '-'}
+    positions = []
+    wanted = {ply: phase for phase, plies in CORPUS_PLIES.items() for ply in plies}
+    game = 0
+    while game < numGames:
+        board = getNewBoard()
+        resetBoard(board)
+        tile = BLACK_TILE
+        found = []
+        for ply in range(max(wanted) + 1):
+            possibleMoves = getValidMoves(board, tile)
+            if not possibleMoves:
+                tile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE
+                possibleMoves = getValidMoves(board, tile)
+                if not possibleMoves:
+                    break
+            if ply in wanted:
+                found.append({'name': '%s-%d-%d' % (wanted[ply], game, ply), 'phase': wanted[ply],
+                              'squares': ''.join(symbols[board[x][y]] for x in range(8) for y in range(8)),
+                              'toMove': symbols[tile]})
+            x, y = rng.choice(possibleMoves)
+            makeMove(board, tile, x, y)
+            tile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE
+        if len(found) == len(wanted): # games which end early are skipped
+            positions.extend(found)
+            game += 1
+    return {'version': CORPUS_VERSION, 'positions': positions}
+
+def loadCorpus():
+    with open(CORPUS_FILE) as f:
+        corpus = json.load(f)
+    if corpus['version'] != CORPUS_VERSION:
+        raise Exception("%s is version %s, expected %s." % (CORPUS_FILE, corpus['version'], CORPUS_VERSION))
+    tiles = {'X': BLACK_TILE, 'O': WHITE_TILE, '-': EMPTY_SPACE}
+    positions = []
+    for position in corpus['positions']:
+        board = [[tiles[position['squares'][x*8 + y]] for y in range(8)] for x in range(8)]
+        positions.append((position['phase'], board, tiles[position['toMove']]))
+    return positions
+
+def percentile(values, p):
+    # Linear interpolation between the closest ranks of the sorted values.
+    values = sorted(values)
+    rank = (len(values) - 1) * p / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+def resetCounters():
+    # Clears the node and simulation counters, and the shared evaluation cache so that repeats don't start warm.
+    minimax.resetSearchStats()
+    endgame.resetEndgameStats()
+    mcts.mctsStats['simulations'] = 0
+    SHARED_EVALUATION_CACHE.clear()
+
+def benchmarkAgent(spec, positions, repeat=5, seed=0):
+    """
+    Plays one move with the agent from every position, repeat times for the timings and once more under tracemalloc
+    for the memory. Each repeat goes through the whole corpus, so a slow spell on the machine hits one repeat of many
+    positions rather than every repeat of a few. Returns {phase: stats}.
+    """
+    agent = makeAgent(spec)
+    random.seed(seed)
+    times = [[] for position in positions] # seconds per repeat, for each position
+    work = [[0, 0] for position in positions] # nodes and simulations, summed over the repeats
+    for i in range(repeat):
+        for j, (phase, board, tile) in enumerate(positions):
+            board = copy.deepcopy(board)
+            resetCounters()
+            start = time.perf_counter()
+            agent(board, tile)
+            times[j].append(time.perf_counter() - start)
+            work[j][0] += minimax.searchStats['nodes'] + endgame.endgameStats['nodes']
+            work[j][1] += mcts.mctsStats['simulations']
+    results = {}
+    for phase in PHASES:
+        indices = [j for j, position in enumerate(positions) if position[0] == phase]
+        tracemalloc.start()
+        peak = 0
+        for j in indices:
+            board, tile = copy.deepcopy(positions[j][1]), positions[j][2]
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            agent(board, tile)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+        phaseTimes = [t for j in indices for t in times[j]]
+        seconds = sum(phaseTimes)
+        results[phase] = {'moves': len(phaseTimes),
+                          'meanMs': 1000 * seconds / len(phaseTimes),
+                          'p50Ms': 1000 * percentile(phaseTimes, 50),
+                          'p90Ms': 1000 * percentile(phaseTimes, 90),
+                          'p99Ms': 1000 * percentile(phaseTimes, 99),
+                          'maxMs': 1000 * max(phaseTimes),
+                          # the mean over the positions of each one's fastest repeat
+                          'bestMeanMs': 1000 * sum(min(times[j]) for j in indices) / len(indices),
+                          'nodesPerSecond': sum(work[j][0] for j in indices) / seconds if seconds else 0.0,
+                          'simulationsPerSecond': sum(work[j][1] for j in indices) / seconds if seconds else 0.0,
+                          'peakMemoryKB': peak / 1024}
+    return results
+
+def compareWithBaseline(results, baseline, threshold, minTimeChange=MIN_TIME_CHANGE_MS,
+                        minMemoryChange=MIN_MEMORY_CHANGE_KB):
+    # Returns a list of (agent, phase, metric, old, new) for every time (bestMeanMs) or peak memory that grew by more
+    # than threshold (a fraction) compared with the baseline, and by more than minTimeChange milliseconds or
+    # minMemoryChange KB. Agents, phases or metrics missing from the baseline are skipped.
+    regressions = []
+    for spec, phases in results.items():
+        for phase, stats in phases.items():
+            old = baseline.get(spec, {}).get(phase)
+            if old is None:
+                continue
+            for metric, minChange in (('bestMeanMs', minTimeChange), ('peakMemoryKB', minMemoryChange)):
+                if metric not in old:
+                    continue
+                if stats[metric] > old[metric] * (1 + threshold) and stats[metric] - old[metric] > minChange:
+                    regressions.append((spec, phase, metric, old[metric], stats[metric]))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time per move, throughput and peak memory of each agent.')
+    parser.add_argument('--agents', nargs='+', default=DEFAULT_AGENTS)
+    parser.add_argument('--repeat', type=int, default=5, help='times to play each position for the timings')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results to this JSON file (e.g. to use as a baseline later)')
+    parser.add_argument('--baseline', help='JSON file from an earlier --output run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed fractional increase of best time and peak memory over the baseline')
+    parser.add_argument('--min-change-ms', type=float, default=MIN_TIME_CHANGE_MS,
+                        help='time increases up to this many milliseconds are never regressions')
+    parser.add_argument('--min-change-kb', type=float, default=MIN_MEMORY_CHANGE_KB,
+                        help='peak memory increases up to this many KB are never regressions')
+    parser.add_argument('--build-corpus', action='store_true', help='rewrite %s and exit' % CORPUS_FILE)
+    args = parser.parse_args()
+    if args.build_corpus:
+        with open(CORPUS_FILE, 'w') as f:
+            json.dump(buildCorpus(), f, indent=1)
+        sys.exit(0)
+
+    positions = loadCorpus()
+    results = {}
+    print('%-24s %-8s %9s %9s %9s %9s %9s %11s %11s %10s' % ('agent', 'phase', 'mean ms', 'p50 ms', 'p90 ms', 'p99 ms',
+                                                             'best ms', 'nodes/s', 'sims/s', 'peak KB'))
+    for spec in args.agents:
+        results[spec] = benchmarkAgent(spec, positions, args.repeat, args.seed)
+        for phase, stats in results[spec].items():
+            print('%-24s %-8s %9.2f %9.2f %9.2f %9.2f %9.2f %11.0f %11.1f %10.1f'
+                  % (spec, phase, stats['meanMs'], stats['p50Ms'], stats['p90Ms'], stats['p99Ms'],
+                     stats['bestMeanMs'], stats['nodesPerSecond'], stats['simulationsPerSecond'],
+                     stats['peakMemoryKB']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'corpusVersion': CORPUS_VERSION, 'commit': gitCommit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                       'python': platform.python_version(), 'repeat': args.repeat, 'results': results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['corpusVersion'] != CORPUS_VERSION:
+            raise Exception("The baseline was made with corpus version %s, not %s." % (baseline['corpusVersion'],
+                                                                                      CORPUS_VERSION))
+        regressions = compareWithBaseline(results, baseline['results'], args.threshold, args.min_change_ms,
+                                          args.min_change_kb)
+        for spec, phase, metric, old, new in regressions:
+            print('REGRESSION %s %s %s: %.2f -> %.2f (+%.2f)' % (spec, phase, metric, old, new, new - old))
+        if regressions:
+            sys.exit(1)
+        print('No regressions over %.0f%% (and %.1f ms or %.0f KB) against %s.'
+              % (100 * args.threshold, args.min_change_ms, args.min_change_kb, args.baseline))
@@ -0,0 +1,102 @@
+# Micro-benchmark of the cost of one leaf evaluation: the fused evaluation functions in minimax.py (extractFeatures
+# plus weights) against calling each heuristic separately (separateHeuristicsEvaluation). Both run on the current
+# bitboard move generator, so this measures the gain from fusing alone, not the cost per leaf before the bitboard
+# changes. Also checks that both give the same score. With --search-depth, also compares the throughput of fixed-depth minimax
+# searches with and without the shared evaluation cache (evaluation_cache.py).
+#
+# Usage: python benchmark_evaluation.py [--games 20] [--seed 0] [--search-depth 3]
+
+import argparse, copy, random, time
+from board_functions import *
+import minimax
+from evaluation_cache import EvaluationCache, cachedEvaluation
+
+EVALUATIONS = [('evaluation2', minimax.EVALUATION2_WEIGHTS),
+               ('evaluation3', minimax.EVALUATION3_WEIGHTS),
+               ('evaluation4', minimax.EVALUATION4_WEIGHTS),
+               ('evaluation5', minimax.EVALUATION5_WEIGHTS),
+               ('evaluation6', minimax.EVALUATION6_WEIGHTS),
+               ('evaluation7', minimax.EVALUATION7_WEIGHTS),
+               ('evaluation8', minimax.EVALUATION8_WEIGHTS)]
+
+def randomGamePositions(numGames, seed):
+    # Every position from numGames random games, so all phases of the game are covered.
+    rng = random.Random(seed)
+    boards = []
+    for i in range(numGames):
+        board = getNewBoard()
+        resetBoard(board)
+        tile, otherTile = BLACK_TILE, WHITE_TILE
+        while True:
+            possibleMoves = getValidMoves(board, tile)
+            if not possibleMoves:
+                tile, otherTile = otherTile, tile
+                possibleMoves = getValidMoves(board, tile)
+                if not possibleMoves:
+                    break
+            x, y = rng.choice(possibleMoves)
+            makeMove(board, tile, x, y)
+            tile, otherTile = otherTile, tile
+            boards.append(copy.deepcopy(board))
+    return boards
+
+def timePerLeaf(function, boards):
+    # Average microseconds per call over all the boards.
+    start = time.perf_counter()
+    for board in boards:
+        function(board)
+    return (time.perf_counter() - start) / len(boards) * 1e6
+
+def benchmark(boards):
+    # Returns (name, separate microseconds, fused microseconds) per evaluation function, both on the current move
+    # generator.
+    results = []
+    for name, weights in EVALUATIONS:
+        fused = getattr(minimax, name)
+        for board in boards:
+            expected = minimax.separateHeuristicsEvaluation(board, weights)
+            if abs(fused(board) - expected) > 1e-9 * (abs(expected) + 1):
+                raise Exception("%s differs from the separate heuristics on %s" % (name, board))
+        separate = timePerLeaf(lambda board: minimax.separateHeuristicsEvaluation(board, weights), boards)
+        results.append((name, separate, timePerLeaf(fused, boards)))
+    return results
+
+def benchmarkCache(boards, depth, evaluation=minimax.evaluation3):
+    """
+    Plays the minimax move for the side with most moves in each position, as in a game: once with the plain evaluation
+    function and once with it wrapped in a fresh EvaluationCache. Returns (plain seconds, cached seconds, cache stats).
+    """
+    cache = EvaluationCache()
+    cached = cachedEvaluation(evaluation, cache)
+    times = []
+    moves = []
+    for function in (evaluation, cached):
+        chosen = []
+        start = time.perf_counter()
+        for board in boards:
+            tile = WHITE_TILE if len(getValidMoves(board, WHITE_TILE)) >= len(getValidMoves(board, BLACK_TILE)) else BLACK_TILE
+            chosen.append(minimax.minimaxMove(copy.deepcopy(board), depth, tile, float("-inf"), float("inf"), function,
+                                              endgameEmpties=0))
+        times.append(time.perf_counter() - start)
+        moves.append(chosen)
+    if moves[0] != moves[1]:
+        raise Exception("The cached evaluation changed the moves chosen.")
+    return times[0], times[1], cache.stats()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time per leaf of the evaluation functions, fused and as separate heuristics.')
+    parser.add_argument('--games', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--search-depth', type=int, default=0,
+                        help='also time minimax searches of this depth with and without the evaluation cache')
+    args = parser.parse_args()
+    boards = randomGamePositions(args.games, args.seed)
+    print('%d positions' % len(boards))
+    print('%-12s %12s %12s %14s' % ('function', 'separate us', 'fused us', 'fused speedup'))
+    for name, separate, fused in benchmark(boards):
+        print('%-12s %12.1f %12.1f %13.2fx' % (name, separate, fused, separate / fused))
+    if args.search_depth:
+        positions = [board for board in boards if getValidMoves(board, WHITE_TILE) or getValidMoves(board, BLACK_TILE)]
+        plain, cached, stats = benchmarkCache(positions[:200], args.search_depth)
+        print('depth %d search: %.2fs without cache, %.2fs with cache (%.2fx), hit rate %.1f%%, %d evictions'
+              % (args.search_depth, plain, cached, plain / cached, 100 * stats['hitRate'], stats['evictions']))
@@ -0,0 +1,89 @@
+# Bitboard representation of an Othello position, used underneath the functions in board_functions.
+# A position is two 64-bit integers: the discs of the player to move ('own') and those of the opponent ('opp').
+# Square (x, y) of the list-of-lists board maps to bit x*8 + y, so board[x][y] and bit (x*8 + y) refer to the same
+# square and iterating over the set bits in ascending order visits squares in the same order as
+# "for x in range(8): for y in range(8)".
+
+FULL_MASK = 0xFFFFFFFFFFFFFFFF
+# Squares which are not in the y == 0 or y == 7 columns. Any run of discs that is flanked horizontally or diagonally
+# can only pass through these squares, so masking with this stops shifts from wrapping round to the next row.
+INNER_COLUMNS_MASK = 0x7E7E7E7E7E7E7E7E
+
+# (shift, mask) for each of the eight directions. A positive shift moves a bit towards higher squares.
+DIRECTIONS = [(1, INNER_COLUMNS_MASK), (-1, INNER_COLUMNS_MASK),
+              (8, FULL_MASK), (-8, FULL_MASK),
+              (9, INNER_COLUMNS_MASK), (-9, INNER_COLUMNS_MASK),
+              (7, INNER_COLUMNS_MASK), (-7, INNER_COLUMNS_MASK)]
+
+START_BLACK = (1 << (3*8 + 4)) | (1 << (4*8 + 3)) # board[3][4] and board[4][3]
+START_WHITE = (1 << (3*8 + 3)) | (1 << (4*8 + 4)) # board[3][3] and board[4][4]
+
+def squareToCoords(square):
+    # Converts a bit index into the (x, y) coordinates used by the list-of-lists board.
+    return (square >> 3, square & 7)
+
+def coordsToSquare(x, y):
+    return x*8 + y
+
+def popcount(bits):
+    # Number of discs in a bitboard.
+    return bin(bits).count('1')
+
+if hasattr(int, 'bit_count'): # Python 3.10+ counts bits natively, which is several times faster.
+    popcount = int.bit_count
+
+def iterSquares(bits):
+    # Yields the index of every set bit, lowest first.
+    while bits:
+        lowest = bits & -bits
+        yield lowest.bit_length() - 1
+        bits ^= lowest
+
+def getMovesMask(own, opp):
+    # Returns a bitboard with a bit set on every legal move for the player owning 'own'.
+    empty = ~(own | opp) & FULL_MASK
+    moves = 0
+    for shift, mask in DIRECTIONS:
+        flankable = opp & mask
+        if shift > 0:
+            run = flankable & (own << shift)
+            # An Othello run is at most six discs long, so five more steps cover every case.
+            run |= flankable & (run << shift)
+            run |= flankable & (run << shift)
+            run |= flankable & (run << shift)
+            run |= flankable & (run << shift)
+            run |= flankable & (run << shift)
+            moves |= empty & (run << shift)
+        else:
+            shift = -shift
+            run = flankable & (own >> shift)
+            run |= flankable & (run >> shift)
+            run |= flankable & (run >> shift)
+            run |= flankable & (run >> shift)
+            run |= flankable & (run >> shift)
+            run |= flankable & (run >> shift)
+            moves |= empty & (run >> shift)
+    return moves
+
+def getFlipsMask(own, opp, square):
+    # Returns a bitboard of the opponent discs flipped by playing on 'square'. Zero means the move is illegal.
+    # The square is assumed to be empty.
+    move = 1 << square
+    flips = 0
+    for shift, mask in DIRECTIONS:
+        flankable = opp & mask
+        run = 0
+        if shift > 0:
+            cursor = move << shift
+            while cursor & flankable:
+                run |= cursor
+                cursor <<= shift
+        else:
+            shift = -shift
+            cursor = move >> shift
+            while cursor & flankable:
+                run |= cursor
+                cursor >>= shift
+        if run and cursor & own:
+            flips |= run
+    return flips
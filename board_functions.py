@@ -2,6 +2,7 @@
 # These functions are purely for manipulating the board, unlike the functions in flippy which are used to run the game using pygame.
 
 import copy, random
+from bitboard import getMovesMask, getFlipsMask, iterSquares, squareToCoords, coordsToSquare
 
 BOARDWIDTH = 8 # how many columns of spaces on the game board
 BOARDHEIGHT = 8 # how many rows of spaces on the game board
@@ -31,53 +32,50 @@ def getNewBoard():
 
     return board
 
+def boardToBitboards(board):
+    # Converts a list-of-lists board into a pair of bitboards (white discs, black discs). See bitboard.py.
+    white = 0
+    black = 0
+    bit = 1
+    for column in board:
+        for space in column:
+            if space == WHITE_TILE:
+                white |= bit
+            elif space == BLACK_TILE:
+                black |= bit
+            bit <<= 1
+    return white, black
+
+def bitboardsToBoard(white, black):
+    # Converts a pair of bitboards back into a list-of-lists board.
+    board = []
+    bit = 1
+    for x in range(BOARDWIDTH):
+        column = []
+        for y in range(BOARDHEIGHT):
+            column.append(WHITE_TILE if white & bit else BLACK_TILE if black & bit else EMPTY_SPACE)
+            bit <<= 1
+        board.append(column)
+    return board
+
+def getOwnAndOpponentBitboards(board, tile):
+    # Returns the bitboards (own, opponent) from the point of view of the player with the given tile.
+    white, black = boardToBitboards(board)
+    if tile == WHITE_TILE:
+        return white, black
+    return black, white
+
 def isValidMove(board, tile, xstart, ystart):
     # Returns False if the player's move is invalid. If it is a valid
     # move, returns a list of spaces of the captured pieces.
-    if board[xstart][ystart] != EMPTY_SPACE or not isOnBoard(xstart, ystart):
+    if not isOnBoard(xstart, ystart) or board[xstart][ystart] != EMPTY_SPACE:
         return False
 
-    board[xstart][ystart] = tile # temporarily set the tile on the board.
-
-    if tile == WHITE_TILE:
-        otherTile = BLACK_TILE
-    else:
-        otherTile = WHITE_TILE
-
-    tilesToFlip = []
-    # check each of the eight directions:
-    for xdirection, ydirection in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
-        x, y = xstart, ystart
-        x += xdirection
-        y += ydirection
-        if isOnBoard(x, y) and board[x][y] == otherTile:
-            # The piece belongs to the other player next to our piece.
-            x += xdirection
-            y += ydirection
-            if not isOnBoard(x, y):
-                continue
-            while board[x][y] == otherTile:
-                x += xdirection
-                y += ydirection
-                if not isOnBoard(x, y):
-                    break # break out of while loop, continue in for loop
-            if not isOnBoard(x, y):
-                continue
-            if board[x][y] == tile:
-                # There are pieces to flip over. Go in the reverse
-                # direction until we reach the original space, noting all
-                # the tiles along the way.
-                while True:
-                    x -= xdirection
-                    y -= ydirection
-                    if x == xstart and y == ystart:
-                        break
-                    tilesToFlip.append([x, y])
-
-    board[xstart][ystart] = EMPTY_SPACE # make space empty
-    if len(tilesToFlip) == 0: # If no tiles flipped, this move is invalid
+    own, opp = getOwnAndOpponentBitboards(board, tile)
+    flips = getFlipsMask(own, opp, coordsToSquare(xstart, ystart))
+    if flips == 0: # If no tiles flipped, this move is invalid
         return False
-    return tilesToFlip
+    return [list(squareToCoords(square)) for square in iterSquares(flips)]
 
 def isOnBoard(x, y):
     # Returns True if the coordinates are located on the board.
@@ -93,39 +91,68 @@ def getBoardWithValidMoves(board, tile):
 
 def getValidMoves(board, tile):
     # Returns a list of (x,y) tuples of all valid moves.
-    validMoves = []
-
-    for x in range(BOARDWIDTH):
-        for y in range(BOARDHEIGHT):
-            if isValidMove(board, tile, x, y) != False:
-                validMoves.append((x, y))
-    return validMoves
+    own, opp = getOwnAndOpponentBitboards(board, tile)
+    return [squareToCoords(square) for square in iterSquares(getMovesMask(own, opp))]
+
+def getValidMovesForBothSides(board):
+    # Returns the lists of valid moves for white and for black, (whiteMoves, blackMoves), reading the board only once.
+    # Both lists are empty when the game is over.
+    white, black = boardToBitboards(board)
+    whiteMoves = [squareToCoords(square) for square in iterSquares(getMovesMask(white, black))]
+    blackMoves = [squareToCoords(square) for square in iterSquares(getMovesMask(black, white))]
+    return whiteMoves, blackMoves
+
+def generateMovesWithFlips(board, tile):
+    # Yields ((x, y), flippedTiles) for every valid move, in the same order as getValidMoves. The flips can be passed
+    # straight to applyMove so they don't have to be worked out a second time. The moves are generated from the board
+    # as it was on the first call, so the board may be changed between steps as long as it is put back (see unmakeMove).
+    own, opp = getOwnAndOpponentBitboards(board, tile)
+    for square in iterSquares(getMovesMask(own, opp)):
+        flips = getFlipsMask(own, opp, square)
+        yield (square >> 3, square & 7), [(f >> 3, f & 7) for f in iterSquares(flips)]
 
 def getScoreOfBoard(board):
     # Determine the score by counting the tiles.
     xscore = 0
     oscore = 0
-    for x in range(BOARDWIDTH):
-        for y in range(BOARDHEIGHT):
-            if board[x][y] == WHITE_TILE:
-                xscore += 1
-            if board[x][y] == BLACK_TILE:
-                oscore += 1
+    for column in board:
+        xscore += column.count(WHITE_TILE)
+        oscore += column.count(BLACK_TILE)
     return {WHITE_TILE:xscore, BLACK_TILE:oscore}
 
 def makeMove(board, tile, xstart, ystart):
     # Place the tile on the board at xstart, ystart, and flip tiles
-    # Returns False if this is an invalid move, True if it is valid.
-    tilesToFlip = isValidMove(board, tile, xstart, ystart)
+    # Returns False if this is an invalid move. If it is valid, returns an undo record (xstart, ystart, flippedTiles)
+    # which can be passed to unmakeMove to restore the board, so searches don't need to copy the board.
+    if not isOnBoard(xstart, ystart) or board[xstart][ystart] != EMPTY_SPACE:
+        return False
+    own, opp = getOwnAndOpponentBitboards(board, tile)
+    flips = getFlipsMask(own, opp, coordsToSquare(xstart, ystart))
 
-    if tilesToFlip == False:
+    if flips == 0:
         return False
 
-    board[xstart][ystart] = tile
+    return applyMove(board, tile, (xstart, ystart), [(f >> 3, f & 7) for f in iterSquares(flips)])
 
-    for x, y in tilesToFlip:
+def applyMove(board, tile, move, flippedTiles):
+    # Like makeMove, but for a move whose flips are already known (e.g. from generateMovesWithFlips), so no checking
+    # is done. Returns the undo record.
+    xstart, ystart = move
+    board[xstart][ystart] = tile
+    for x, y in flippedTiles:
         board[x][y] = tile
-    return True
+    return (xstart, ystart, flippedTiles)
+
+def unmakeMove(board, undo):
+    # Reverts a move made by makeMove, given the undo record it returned.
+    xstart, ystart, flippedTiles = undo
+    if board[xstart][ystart] == WHITE_TILE:
+        otherTile = BLACK_TILE
+    else:
+        otherTile = WHITE_TILE
+    board[xstart][ystart] = EMPTY_SPACE
+    for x, y in flippedTiles:
+        board[x][y] = otherTile
 
 def isOnCorner(x, y):
     # Returns True if the position is in one of the four corners.
@@ -152,9 +179,9 @@ def getComputerMove(board, computerTile):
     # Go through all possible moves and remember the best scoring move
     bestScore = -1
     for x, y in possibleMoves:
-        dupeBoard = copy.deepcopy(board)
-        makeMove(dupeBoard, computerTile, x, y)
-        score = getScoreOfBoard(dupeBoard)[computerTile]
+        undo = makeMove(board, computerTile, x, y)
+        score = getScoreOfBoard(board)[computerTile]
+        unmakeMove(board, undo)
         if score > bestScore:
             bestMove = [x, y]
             bestScore = score
@@ -0,0 +1,183 @@
+# MCTS with the tree stored as a struct of arrays instead of one mcts.Node object per node. Node i is described by
+# the i-th entry of a handful of typed arrays (visits, value, parent, first child, number of children, move, side to
+# move and the position as two bitboards), so a node costs a few dozen bytes instead of a Python object with a
+# deep-copied 8x8 board and a dict of children. The children of a node are generated together, in random order, the
+# first time it is selected and stored next to each other, so they are found from the first child index alone.
+#
+# Run this file to compare the memory per node with mcts.Node, e.g. python compact_mcts.py --simulations 2000
+
+import argparse, copy, math, random, time, tracemalloc
+from array import array
+from board_functions import *
+from bitboard import getMovesMask, getFlipsMask, iterSquares, squareToCoords, popcount
+from mcts import Node, Playout, runSimulations
+from endgame import ENDGAME_EMPTIES, countEmpties, endgameMove
+
+NOT_GENERATED = -1 # firstChild of a node whose children haven't been generated yet
+PASS = -1 # move of a child reached by passing
+
+class CompactTree:
+    """
+    An MCTS tree for the given position and player to move, grown by calling run. Values follow mcts.Node: each node's
+    value counts the playouts won minus those lost by the player to move at that node.
+    """
+    def __init__(self, board, tile, C=4, playout='DynamicRoxanne3'):
+        self.C = C
+        self.playout = playout
+        self.visits = array('i')
+        self.value = array('i')
+        self.parent = array('i')
+        self.firstChild = array('i')
+        self.numChildren = array('B')
+        self.numExpanded = array('B') # children[:numExpanded] have been visited, in the order they were generated
+        self.move = array('b')
+        self.whiteToMove = array('b')
+        self.white = array('Q')
+        self.black = array('Q')
+        white, black = boardToBitboards(board)
+        self.addNode(-1, PASS, white, black, tile == WHITE_TILE)
+
+    def __len__(self):
+        return len(self.visits)
+
+    def addNode(self, parent, move, white, black, whiteToMove):
+        self.visits.append(0)
+        self.value.append(0)
+        self.parent.append(parent)
+        self.firstChild.append(NOT_GENERATED)
+        self.numChildren.append(0)
+        self.numExpanded.append(0)
+        self.move.append(move)
+        self.whiteToMove.append(whiteToMove)
+        self.white.append(white)
+        self.black.append(black)
+
+    def generateChildren(self, node):
+        # Adds a child for every legal move (a single pass child if there are none but the opponent can move, no
+        # children if the game is over), shuffled so that they can be expanded in order.
+        white, black = self.white[node], self.black[node]
+        whiteToMove = self.whiteToMove[node]
+        own, opp = (white, black) if whiteToMove else (black, white)
+        self.firstChild[node] = len(self.visits)
+        squares = list(iterSquares(getMovesMask(own, opp)))
+        if squares:
+            random.shuffle(squares)
+            for square in squares:
+                flips = getFlipsMask(own, opp, square)
+                newOwn, newOpp = own | flips | (1 << square), opp & ~flips
+                if whiteToMove:
+                    self.addNode(node, square, newOwn, newOpp, False)
+                else:
+                    self.addNode(node, square, newOpp, newOwn, True)
+        elif getMovesMask(opp, own):
+            self.addNode(node, PASS, white, black, not whiteToMove)
+        self.numChildren[node] = len(self.visits) - self.firstChild[node]
+
+    def select(self, node):
+        # Returns the child with the greatest UCB1 value, as in mcts.Node.ucb1.
+        visits, value = self.visits, self.value
+        logVisits = math.log(visits[node])
+        best, bestUcb = -1, float("-inf")
+        first = self.firstChild[node]
+        for child in range(first, first + self.numChildren[node]):
+            ucb = -value[child]/visits[child] + self.C*math.sqrt(2 * logVisits / visits[child])
+            if ucb > bestUcb:
+                best, bestUcb = child, ucb
+        return best
+
+    def backPropagate(self, node, winner):
+        # Adds the playout result to the node and all its ancestors, iteratively.
+        visits, value, parent, whiteToMove = self.visits, self.value, self.parent, self.whiteToMove
+        whiteWon = winner == 'WHITE'
+        while node >= 0:
+            visits[node] += 1
+            if winner != 'TIE':
+                value[node] += 1 if whiteToMove[node] == whiteWon else -1
+            node = parent[node]
+
+    def winner(self, node):
+        numWhite, numBlack = popcount(self.white[node]), popcount(self.black[node])
+        return 'WHITE' if numWhite > numBlack else 'BLACK' if numBlack > numWhite else 'TIE'
+
+    def simulate(self):
+        # One iteration of MCTS: selection, expansion, playout, backpropagation.
+        node = 0
+        while True:
+            if self.firstChild[node] == NOT_GENERATED:
+                self.generateChildren(node)
+            numChildren = self.numChildren[node]
+            if numChildren == 0: # game over
+                self.backPropagate(node, self.winner(node))
+                return
+            if self.numExpanded[node] < numChildren:
+                child = self.firstChild[node] + self.numExpanded[node]
+                self.numExpanded[node] += 1
+                node = child
+                break
+            node = self.select(node)
+        board = bitboardsToBoard(self.white[node], self.black[node])
+        self.backPropagate(node, Playout(board, WHITE_TILE if self.whiteToMove[node] else BLACK_TILE, self.playout))
+
+    def run(self, numSimulations, deadline=None):
+        # Runs numSimulations simulations, or fewer if the deadline (a time.time() value) passes first.
+        for i in range(numSimulations):
+            if deadline is not None and i > 0 and time.time() >= deadline:
+                break
+            self.simulate()
+
+    def bestMove(self):
+        # The move to the child with the lowest value, i.e. the best one for the player at the root, as (x, y).
+        first = self.firstChild[0]
+        child = min(range(first, first + self.numExpanded[0]), key=lambda child: self.value[child])
+        return squareToCoords(self.move[child])
+
+    def memoryPerNode(self):
+        # Bytes of array storage per node.
+        arrays = [self.visits, self.value, self.parent, self.firstChild, self.numChildren, self.numExpanded,
+                  self.move, self.whiteToMove, self.white, self.black]
+        return sum(a.buffer_info()[1] * a.itemsize for a in arrays) / len(self)
+
+def compactMCTS(board, tile, numSimulations, C=4, playout='DynamicRoxanne3', endgameEmpties=ENDGAME_EMPTIES,
+                timeLimit=None):
+    """
+    Same as mcts.MCTS(board, tile, numSimulations, C, playout, endgameEmpties), but with a CompactTree.
+    """
+    if countEmpties(board) <= endgameEmpties:
+        return tuple(endgameMove(board, tile)[0])
+    deadline = None if timeLimit is None else time.time() + timeLimit
+    tree = CompactTree(board, tile, C, playout)
+    tree.run(numSimulations, deadline)
+    return tree.bestMove()
+
+def measureMemory(numSimulations, playout):
+    # Grows a tree of each kind from the start position and returns (bytes per Node, bytes per CompactTree node),
+    # measured with tracemalloc.
+    board = getNewBoard()
+    resetBoard(board)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    rootNode = Node(copy.deepcopy(board), BLACK_TILE, None, 4)
+    runSimulations(rootNode, numSimulations, playout)
+    nodes = 0
+    stack = [rootNode]
+    while stack:
+        node = stack.pop()
+        nodes += 1
+        stack.extend(node.children.values())
+    nodeBytes = (tracemalloc.get_traced_memory()[0] - before) / nodes
+    del rootNode, stack, node
+    before = tracemalloc.get_traced_memory()[0]
+    tree = CompactTree(board, BLACK_TILE, 4, playout)
+    tree.run(numSimulations)
+    compactBytes = (tracemalloc.get_traced_memory()[0] - before) / len(tree)
+    tracemalloc.stop()
+    return nodeBytes, compactBytes
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory per node of the compact MCTS tree and of mcts.Node.')
+    parser.add_argument('--simulations', type=int, default=1000)
+    parser.add_argument('--playout', default='Random', choices=['DynamicRoxanne3', 'evaluation3', 'Random'])
+    args = parser.parse_args()
+    nodeBytes, compactBytes = measureMemory(args.simulations, args.playout)
+    print('mcts.Node: %.0f bytes per node' % nodeBytes)
+    print('CompactTree: %.0f bytes per node (%.1fx smaller)' % (compactBytes, nodeBytes / compactBytes))
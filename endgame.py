@@ -0,0 +1,167 @@
+# Exact endgame solver. Once only a few empty squares are left the game tree is small enough to search to the end, so
+# instead of a heuristic evaluation this returns the exact final disc difference with perfect play from both sides.
+# It works directly on bitboards (see bitboard.py) in negamax form: scores are always from the point of view of the
+# player to move, and the final score is own discs minus opponent discs, counted the same way as getScoreOfBoard.
+
+from bitboard import FULL_MASK, getMovesMask, getFlipsMask, iterSquares, popcount
+from board_functions import EMPTY_SPACE, getOwnAndOpponentBitboards
+
+# minimaxMove, iterativeDeepeningMove and MCTS hand over to the solver once there are this many empty squares or fewer.
+ENDGAME_EMPTIES = 10
+
+# Below this many empties, moves are ordered by parity only; computing the opponent's mobility after every move
+# (fastest-first ordering) costs more than it saves this close to the end.
+FASTEST_FIRST_EMPTIES = 7
+
+# The four 4x4 quadrants of the board, used for parity ordering.
+QUADRANTS = [0x0F0F0F0F, 0xF0F0F0F0, 0x0F0F0F0F << 32, 0xF0F0F0F0 << 32]
+
+# Counts solver nodes; reset with resetEndgameStats().
+endgameStats = {'nodes': 0}
+
+def resetEndgameStats():
+    endgameStats['nodes'] = 0
+
+def countEmpties(board):
+    return sum(column.count(EMPTY_SPACE) for column in board)
+
+def oddQuadrants(empty):
+    # Returns a bitboard of the quadrants holding an odd number of empty squares. Playing into one of these regions
+    # first tends to leave us with the last move in it (parity), which is usually good.
+    odd = 0
+    for quadrant in QUADRANTS:
+        if popcount(empty & quadrant) & 1:
+            odd |= quadrant
+    return odd
+
+def solveLast1(own, opp, square):
+    # Exact score with one empty square left: whoever can play there does; otherwise the game is over.
+    diff = popcount(own) - popcount(opp)
+    flips = getFlipsMask(own, opp, square)
+    if flips:
+        return diff + 2*popcount(flips) + 1
+    flips = getFlipsMask(opp, own, square)
+    if flips:
+        return diff - 2*popcount(flips) - 1
+    return diff
+
+def solveFew(own, opp, alpha, beta, empties, passed=False):
+    """
+    Solver for the last 2-4 empty squares. Rather than generating a move mask, each empty square in the (already
+    parity-ordered) list is tried directly, since an empty square with no flips is just an illegal move.
+    """
+    endgameStats['nodes'] += 1
+    if len(empties) == 1:
+        return solveLast1(own, opp, empties[0])
+    best = -65
+    for i, square in enumerate(empties):
+        flips = getFlipsMask(own, opp, square)
+        if flips:
+            score = -solveFew(opp & ~flips, own | flips | (1 << square), -beta, -max(alpha, best),
+                              empties[:i] + empties[i+1:])
+            if score > best:
+                best = score
+                if best >= beta:
+                    return best
+    if best == -65: # no legal move
+        if passed: # neither side can move; the game is over
+            return popcount(own) - popcount(opp)
+        return -solveFew(opp, own, -beta, -alpha, empties, True)
+    return best
+
+def orderedEmpties(own, opp):
+    # The empty squares, those in odd quadrants first.
+    empty = ~(own | opp) & FULL_MASK
+    odd = oddQuadrants(empty)
+    return list(iterSquares(empty & odd)) + list(iterSquares(empty & ~odd))
+
+def orderedChildren(own, opp, moves, numEmpties):
+    # Returns (square, childOwn, childOpp) for each move, best first. Children are from the opponent's point of view.
+    odd = oddQuadrants(~(own | opp) & FULL_MASK)
+    children = []
+    for square in iterSquares(moves):
+        flips = getFlipsMask(own, opp, square)
+        childOwn = opp & ~flips
+        childOpp = own | flips | (1 << square)
+        # Fastest-first: prefer the moves which leave the opponent the fewest replies, then those in odd regions.
+        priority = 0 if (odd >> square) & 1 else 1
+        if numEmpties > FASTEST_FIRST_EMPTIES:
+            priority += 2*popcount(getMovesMask(childOwn, childOpp))
+        children.append((priority, square, childOwn, childOpp))
+    children.sort()
+    return [(square, childOwn, childOpp) for priority, square, childOwn, childOpp in children]
+
+def solve(own, opp, alpha, beta, numEmpties, passed=False):
+    """
+    Fail-soft principal variation search to the end of the game. The first move is searched with the full window and
+    the rest with a null window, re-searching only those that turn out better than the best so far.
+
+    Returns the final disc difference for the player to move, exact if it lies strictly between alpha and beta,
+    otherwise a bound.
+    """
+    if numEmpties <= 4:
+        return solveFew(own, opp, alpha, beta, orderedEmpties(own, opp), passed)
+    endgameStats['nodes'] += 1
+    moves = getMovesMask(own, opp)
+    if not moves:
+        if passed or not getMovesMask(opp, own):
+            return popcount(own) - popcount(opp)
+        return -solve(opp, own, -beta, -alpha, numEmpties, True)
+
+    best = -65
+    for square, childOwn, childOpp in orderedChildren(own, opp, moves, numEmpties):
+        if best == -65:
+            score = -solve(childOwn, childOpp, -beta, -alpha, numEmpties - 1)
+        else:
+            score = -solve(childOwn, childOpp, -alpha - 1, -alpha, numEmpties - 1)
+            if alpha < score < beta:
+                score = -solve(childOwn, childOpp, -beta, -score, numEmpties - 1)
+        if score > best:
+            best = score
+            if best > alpha:
+                alpha = best
+                if alpha >= beta:
+                    break
+    return best
+
+def solveEndgame(own, opp, winLossDrawOnly=False):
+    """
+    Solves the position for the player owning 'own'. Returns (square, score) where square is the bit index of the
+    best move (None if there is no legal move) and score is the exact final disc difference. With winLossDrawOnly
+    the search only uses the window (-1, 1), which is much faster; the score is then only guaranteed to have the right
+    sign (positive win, 0 draw, negative loss).
+    """
+    if winLossDrawOnly:
+        alpha, beta = -1, 1
+    else:
+        alpha, beta = -64, 64
+    numEmpties = popcount(~(own | opp) & FULL_MASK)
+    moves = getMovesMask(own, opp)
+    if not moves:
+        return None, solve(own, opp, alpha, beta, numEmpties)
+    bestSquare = None
+    best = -65
+    for square, childOwn, childOpp in orderedChildren(own, opp, moves, numEmpties):
+        if bestSquare is None:
+            score = -solve(childOwn, childOpp, -beta, -alpha, numEmpties - 1)
+        else:
+            score = -solve(childOwn, childOpp, -alpha - 1, -alpha, numEmpties - 1)
+            if alpha < score < beta:
+                score = -solve(childOwn, childOpp, -beta, -score, numEmpties - 1)
+        if score > best:
+            best = score
+            bestSquare = square
+            if best > alpha:
+                alpha = best
+                if alpha >= beta:
+                    break
+    return bestSquare, best
+
+def endgameMove(board, tile, winLossDrawOnly=False):
+    # Board version of solveEndgame: returns the best move for 'tile' as [x, y] (None if it has no move) and the final
+    # disc difference from tile's point of view.
+    own, opp = getOwnAndOpponentBitboards(board, tile)
+    square, score = solveEndgame(own, opp, winLossDrawOnly)
+    if square is None:
+        return None, score
+    return [square >> 3, square & 7], score
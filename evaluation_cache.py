@@ -0,0 +1,87 @@
+# A cache of evaluation function results, shared by every search in the process. The same leaf positions get
+# evaluated again and again: in sibling subtrees of minimax, in the searches for consecutive moves of a game, and in
+# MCTS 'evaluation3' playouts. Caching is opt-in per evaluation function: wrap the function with cachedEvaluation and
+# pass the wrapper wherever the evaluation function would go, e.g.
+#     minimaxMove(board, 3, tile, alpha, beta, cachedEvaluation(evaluation3))
+
+from collections import OrderedDict
+
+# Rough memory used by one cache entry (the dict entry, the key tuple, the position hash and the float score),
+# used to turn a memory budget into a number of entries.
+BYTES_PER_ENTRY = 250
+
+class EvaluationCache:
+    """
+    Least-recently-used cache of scores keyed by (evaluation function, position hash). The hash is the 64-bit hash of
+    the board's squares, so as with the transposition table a collision is possible but vanishingly unlikely, and far
+    cheaper to compute than a Zobrist hash from scratch. Once maxEntries is reached (worked out from sizeMB if not
+    given) the least recently used score is thrown away for each new one.
+    """
+    def __init__(self, sizeMB=32, maxEntries=None):
+        if maxEntries is None:
+            maxEntries = sizeMB * 1024 * 1024 // BYTES_PER_ENTRY
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.entries.clear()
+        self.resetStats()
+
+    def evaluate(self, evaluation, board):
+        # Returns evaluation(board), from the cache if possible.
+        key = (evaluation, hash(tuple(map(tuple, board))))
+        score = self.entries.get(key)
+        if score is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return score
+        self.misses += 1
+        score = evaluation(board)
+        self.entries[key] = score
+        if len(self.entries) > self.maxEntries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return score
+
+    def hitRate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {'entries': len(self.entries),
+                'maxEntries': self.maxEntries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hitRate(),
+                'evictions': self.evictions}
+
+# The process-wide cache used by default.
+SHARED_EVALUATION_CACHE = EvaluationCache()
+
+class CachedEvaluation:
+    """
+    An evaluation function that looks its scores up in an EvaluationCache first. Made by cachedEvaluation; called
+    like the evaluation function it wraps.
+    """
+    def __init__(self, evaluation, cache):
+        self.evaluation = evaluation
+        self.cache = cache
+        self.__name__ = evaluation.__name__ + 'Cached'
+
+    def __call__(self, board):
+        return self.cache.evaluate(self.evaluation, board)
+
+    def __reduce__(self):
+        # When sent to another process (e.g. parallel_search workers), use that process's shared cache rather than
+        # copying this one.
+        return (cachedEvaluation, (self.evaluation,))
+
+def cachedEvaluation(evaluation, cache=None):
+    # Returns a version of the evaluation function which uses the cache (the shared one by default).
+    return CachedEvaluation(evaluation, SHARED_EVALUATION_CACHE if cache is None else cache)
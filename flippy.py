@@ -11,8 +11,11 @@ import random, sys, pygame, time
 from pygame.locals import *
 from simple_agents import getDynamicRoxanneMovev3, getRoxanneMove
 from board_functions import *
-from minimax import minimaxMove, evaluation3
-from mcts import MCTS
+from minimax import iterativeDeepeningMove, evaluation3
+from transposition import TranspositionTable
+from move_ordering import MoveOrderer
+from mcts import MCTSSearcher
+from parallel_mcts import ParallelMCTS
 
 FPS = 10 # frames per second to update the screen
 WINDOWWIDTH = 640 # width of the program's window, in pixels
@@ -44,6 +47,14 @@ GRIDLINECOLOR = BLACK
 TEXTCOLOR = WHITE
 HINTCOLOR = BROWN
 
+# Transposition table and move ordering statistics kept by the 'minimax' opponent from one move to the next.
+MINIMAX_TABLE = TranspositionTable()
+MINIMAX_ORDERER = MoveOrderer()
+# The 'mcts' opponent's search tree, reused from one move to the next.
+MCTS_SEARCHER = MCTSSearcher()
+# Worker pool for the parallel 'mcts' opponent, started on its first move.
+PARALLEL_MCTS = None
+
 
 def main():
     global MAINCLOCK, DISPLAYSURF, FONT, BIGFONT, BGIMAGE
@@ -252,11 +263,23 @@ def getOpponentMove(opponent, board, tile):
     elif opponent == 'Roxanne':
         return getRoxanneMove(board, tile)
     elif opponent[0] == 'minimax':
-        return minimaxMove(board, int(opponent[1]), tile, alpha=float("-inf"), beta=float("inf"), evaluation=evaluation3)
+        # Time budget in seconds, then an optional maximum depth.
+        maxDepth = int(opponent[2]) if len(opponent) > 2 else None
+        return iterativeDeepeningMove(board, tile, evaluation3, float(opponent[1]), maxDepth, MINIMAX_TABLE,
+                                      orderer=MINIMAX_ORDERER)
     elif opponent[0] == 'mcts':
-        return MCTS(board, tile, int(opponent[1]))
+        # Number of simulations (or a time budget such as '2s'), then optionally 'root' or 'leaf' parallelism and the
+        # number of worker processes.
+        if opponent[1].endswith('s'):
+            return MCTS_SEARCHER.move(board, tile, None, timeLimit=float(opponent[1][:-1]), stopEarly=True)
+        if len(opponent) > 2:
+            global PARALLEL_MCTS
+            if PARALLEL_MCTS is None:
+                PARALLEL_MCTS = ParallelMCTS(int(opponent[3]) if len(opponent) > 3 else None, opponent[2])
+            return PARALLEL_MCTS.move(board, tile, int(opponent[1]))
+        return MCTS_SEARCHER.move(board, tile, int(opponent[1]))
     else:
-        raise Exception("Invalid opponent chosen. Choose opponent from the following list: '' (ComputerMove), 'Roxanne3', 'Roxanne', 'minimax', 'mcts'. Type the opponent as a command line argument. When using 'minimax', specify the depth as the next command line argument. When using 'mcts' specify the number of simulations as the next command line argument. E.g. py main.py minimax 1")
+        raise Exception("Invalid opponent chosen. Choose opponent from the following list: '' (ComputerMove), 'Roxanne3', 'Roxanne', 'minimax', 'mcts'. Type the opponent as a command line argument. When using 'minimax', specify the time budget per move in seconds as the next command line argument, optionally followed by a maximum depth. When using 'mcts' specify the number of simulations (or a time budget in seconds followed by 's', e.g. 2s) as the next command line argument, optionally followed by 'root' or 'leaf' to run it in parallel and the number of worker processes. E.g. py main.py minimax 1")
 
 def translateBoardToPixelCoord(x, y):
     return XMARGIN + x * SPACESIZE + int(SPACESIZE / 2), YMARGIN + y * SPACESIZE + int(SPACESIZE / 2)
@@ -1,12 +1,25 @@
 from board_functions import *
-from minimax import checkGameOver, declareWinner, minimaxMove, evaluation3
+from minimax import declareWinner, minimaxMove, evaluation3
 from simple_agents import getRandomComputerMove, getDynamicRoxanneMovev3
-import copy, random, math
+from endgame import ENDGAME_EMPTIES, countEmpties, endgameMove
+from evaluation_cache import cachedEvaluation
+import copy, random, math, time
 
 WHITE_TILE = 'WHITE_TILE' # an arbitrary but unique value
 BLACK_TILE = 'BLACK_TILE' # an arbitrary but unique value
 EMPTY_SPACE = 'EMPTY_SPACE' # an arbitrary but unique value
 
+# Proven results of a node for the player whose tile it is (MCTS-Solver).
+PROVEN_WIN = 1
+PROVEN_DRAW = 0
+PROVEN_LOSS = -1
+
+# Number of playouts run from each leaf by the 'BatchRandom' playout policy, all in one call to batch_playouts.
+BATCH_PLAYOUTS = 64
+
+# evaluation3 using the shared evaluation cache, for the 'evaluation3Cached' playout policy.
+EVALUATION3_CACHED = cachedEvaluation(evaluation3)
+
 # Use classes so that we have a node object for each node in the tree. Each node object keeps track of its child 
 # nodes as well as the number of times it has been visited. 
 # Think using classes makes the coding easier; each node should have some numerical values assigned to it, and various 
@@ -26,23 +39,46 @@ class Node:
         self.depth = 0 if parent is None else parent.depth + 1 # Depth is the depth of the node in the tree.
         self.tile = tile
         self.C = C
+        # Worked out once, the first time they are needed (see generate_actions):
+        self.actions = None # the next possible moves
+        self.untried_actions = None # the moves without a child node yet, in random order
+        self.passes = False # True if self.tile has to pass, so the moves are the opponent's
+        self.winner = None # declareWinner of the board if the game is over
+        self.proven = None # PROVEN_WIN, PROVEN_DRAW or PROVEN_LOSS for self.tile once the result is certain
+
+    def generate_actions(self):
+        """
+        Finds the next possible moves, whether they are a pass followed by the opponent's moves, and whether the game is
+        over, and keeps them on the node.
+        """
+        whiteMoves, blackMoves = getValidMovesForBothSides(self.board)
+        ownMoves, opponentMoves = (whiteMoves, blackMoves) if self.tile == WHITE_TILE else (blackMoves, whiteMoves)
+        if ownMoves:
+            self.actions = ownMoves
+        elif opponentMoves:
+            self.actions = opponentMoves
+            self.passes = True
+        else:
+            self.actions = []
+            self.winner = declareWinner(self.board)
+        self.untried_actions = list(self.actions)
+        random.shuffle(self.untried_actions)
 
     def is_fully_expanded(self):
         """
         Checks if all of the next possible moves have been added to the tree as child nodes.
         """
-        return len(self.children) == len(self.available_actions())
+        if self.actions is None:
+            self.generate_actions()
+        return not self.untried_actions
 
     def available_actions(self):
         """
         Returns all the next possible moves.
         """
-        validMoves = getValidMoves(self.board, self.tile)
-        if validMoves:
-            return getValidMoves(self.board, self.tile)
-        else:
-            opponentTile = list(set([BLACK_TILE, WHITE_TILE]) - set([str(self.tile)]))[0]
-            return getValidMoves(self.board, opponentTile)
+        if self.actions is None:
+            self.generate_actions()
+        return self.actions
 
     def select(self):
         """
@@ -51,26 +87,57 @@ class Node:
         # Child will be of opposite colour so actually want it to be min ucb value I think.
         # Actually depends on what we do in the ucb formula. Can reverse the signs and swap max and min here but its the
         # same.
-        return max(self.children.values(), key=lambda x: x.ucb1())
+        # Children with a proven result are skipped: their value is known, so simulating them again is wasted.
+        unproven = [child for child in self.children.values() if child.proven is None]
+        return max(unproven or self.children.values(), key=lambda x: x.ucb1())
+
+    def child_result(self, child):
+        """
+        Returns the proven result of a child for this node's tile (None if not proven). After a pass the child has the
+        same tile as this node, otherwise the opposite one.
+        """
+        if child.proven is None or child.tile == self.tile:
+            return child.proven
+        return -child.proven
+
+    def update_proof(self):
+        """
+        MCTS-Solver: marks the node as proven if the game is over, if the player to move has a move proven to win for
+        them, or if all moves have been expanded and proven. Returns True if the node has just been proven.
+        """
+        if self.proven is not None:
+            return False
+        if self.winner is not None:
+            if self.winner == 'TIE':
+                self.proven = PROVEN_DRAW
+            else:
+                self.proven = PROVEN_WIN if (self.winner == 'WHITE') == (self.tile == WHITE_TILE) else PROVEN_LOSS
+            return True
+        # The player to move is this node's tile unless it has to pass, in which case it is the opponent.
+        results = [self.child_result(child) for child in self.children.values()]
+        best = PROVEN_LOSS if self.passes else PROVEN_WIN
+        if best in results:
+            self.proven = best
+        elif not self.untried_actions and None not in results:
+            self.proven = min(results) if self.passes else max(results)
+        return self.proven is not None
 
 
     def expand(self):
         """
         Expands the game tree by creating a child node corresponding to any of the possible moves and then returns it.
         """
-        actions = self.available_actions()
-        while True:
-            # Doesn't matter which move to select; all nodes are initialised with arbitrarily high UCB1 value.
-            action = random.sample(actions,1)[0] # Just gets random element from a list.
-            if action not in self.children.keys(): # So self.children.keys() should contain coordinates for the next
-                # possible moves.
-                break
-                
+        if self.actions is None:
+            self.generate_actions()
+        # Doesn't matter which move to select; all nodes are initialised with arbitrarily high UCB1 value.
+        action = self.untried_actions.pop()
         dupeBoard = copy.deepcopy(self.board) # Create duplicated board to pass on to the child node.
-        opponentTile = list(set([BLACK_TILE, WHITE_TILE]) - set([str(self.tile)]))[0]
-        # Play the new move on the child node, i.e. create the child node:
-        makeMove(dupeBoard, self.tile, action[0], action[1])
-        child = Node(dupeBoard, opponentTile, self, self.C) # The child node will be of the opposite colour to the parent node.
+        opponentTile = BLACK_TILE if self.tile == WHITE_TILE else WHITE_TILE
+        # Play the new move on the child node, i.e. create the child node. After a pass the opponent plays the move and
+        # it is this node's tile to move again in the child.
+        mover, childTile = (opponentTile, self.tile) if self.passes else (self.tile, opponentTile)
+        makeMove(dupeBoard, mover, action[0], action[1])
+        child = Node(dupeBoard, childTile, self, self.C)
         self.children[action] = child
         return child
 
@@ -97,6 +164,17 @@ class Node:
         if not self.parent is None:
             self.parent.back_propagate(winner)
 
+    def back_propagate_counts(self, whiteWins, blackWins, ties):
+        """
+        Backpropagates the results of a batch of playouts at once, going up the tree iteratively.
+        """
+        node = self
+        while node is not None:
+            node.visits += whiteWins + blackWins + ties
+            node.value += whiteWins - blackWins if node.tile == WHITE_TILE else blackWins - whiteWins
+            Node.total_visits += whiteWins + blackWins + ties
+            node = node.parent
+
     def ucb1(self):
         """
         The UCB1 formula which balances exploitation vs. exploration. Returns the UCB1 value of this node.
@@ -110,11 +188,9 @@ class Node:
         """
         Checks if the game is over (if there are any more valid moves).
         """
-        gameState = checkGameOver(self.board)
-        if gameState is not 'NOBODY':
-            return True
-        else:
-            return False
+        if self.actions is None:
+            self.generate_actions()
+        return self.winner is not None
         
 def Playout(board, tile, playout):
     """
@@ -123,46 +199,87 @@ def Playout(board, tile, playout):
     """
     playoutBoard = copy.deepcopy(board)
     currentTile = tile
-    gameState = checkGameOver(playoutBoard)
     
-    while gameState is 'NOBODY':
+    while True:
         oppTile = list(set([BLACK_TILE, WHITE_TILE]) - set([str(currentTile)]))[0]
-        if getValidMoves(playoutBoard, currentTile):
-            if playout == 'DynamicRoxanne3':
-                action = getDynamicRoxanneMovev3(playoutBoard, currentTile) # DynamicRoxanne3 playout policy
-            elif playout == 'evaluation3':
-                action = minimaxMove(playoutBoard, 0, currentTile, float("-inf"), float("inf"), evaluation3)
-            elif playout == 'Random':
-                action = getRandomComputerMove(playoutBoard, currentTile) # Random playout policy
-            else:
-                raise Exception("Invalid playout policy selected. Review playout argument.")
-            makeMove(playoutBoard, currentTile, action[0], action[1])
-            currentTile = list(set([BLACK_TILE, WHITE_TILE]) - set([str(currentTile)]))[0] # Switch tiles for the next move
-        elif getValidMoves(playoutBoard, oppTile):
-            if playout == 'DynamicRoxanne3':
-                action = getDynamicRoxanneMovev3(playoutBoard, oppTile) # DynamicRoxanne3 playout policy
-            elif playout == 'evaluation3':
-                action = minimaxMove(playoutBoard, 0, oppTile, float("-inf"), float("inf"), evaluation3)
-            elif playout == 'Random':
-                action = getRandomComputerMove(playoutBoard, oppTile)
-            else:
-                raise Exception("Invalid playout policy selected. Review playout argument.")
-            makeMove(playoutBoard, oppTile, action[0], action[1])
-            currentTile = list(set([BLACK_TILE, WHITE_TILE]) - set([str(oppTile)]))[0]
-
-        gameState = checkGameOver(playoutBoard)
+        # One pass gives the moves of both players, which is also enough to tell whether the game is over.
+        whiteMoves, blackMoves = getValidMovesForBothSides(playoutBoard)
+        if not whiteMoves and not blackMoves:
+            break
+        currentMoves = whiteMoves if currentTile == WHITE_TILE else blackMoves
+        if not currentMoves:
+            currentTile, oppTile = oppTile, currentTile # Pass; the opponent moves again.
+        if playout == 'DynamicRoxanne3':
+            action = getDynamicRoxanneMovev3(playoutBoard, currentTile) # DynamicRoxanne3 playout policy
+        elif playout == 'evaluation3':
+            # Solving the endgame exactly on every playout move would cost far more than the playout itself.
+            action = minimaxMove(playoutBoard, 0, currentTile, float("-inf"), float("inf"), evaluation3, endgameEmpties=0)
+        elif playout == 'evaluation3Cached':
+            # As 'evaluation3', with the scores kept in the shared evaluation cache between playouts.
+            action = minimaxMove(playoutBoard, 0, currentTile, float("-inf"), float("inf"), EVALUATION3_CACHED,
+                                 endgameEmpties=0)
+        elif playout == 'Random':
+            action = getRandomComputerMove(playoutBoard, currentTile) # Random playout policy
+        else:
+            raise Exception("Invalid playout policy selected. Review playout argument.")
+        makeMove(playoutBoard, currentTile, action[0], action[1])
+        currentTile = oppTile # Switch tiles for the next move
 
     winner = declareWinner(playoutBoard)
     return winner
 
-def MCTS(board, tile, numSimulations, C=4, playout='DynamicRoxanne3'):
+# Statistics of the last call to runSimulations: simulations and playouts run, seconds taken and why it stopped ('budget' when
+# numSimulations were run, 'deadline', 'cancelled', 'decided' when the best move could no longer change, or 'proven'
+# when the result at the root was proven).
+mctsStats = {'simulations': 0, 'playouts': 0, 'seconds': 0.0, 'stopReason': None}
+
+def leaderIsDecided(rootNode, remainingSimulations, playoutsPerSimulation=1):
     """
-    Takes the current board state as the root node of the game tree and then runs the MCTS algorithm. Returns the best 
-    move found.
+    Checks whether the move bestRootMove picks can no longer change within remainingSimulations more simulations. Each
+    simulation changes the value of only one root child, by at most the number of playouts it runs, so the gap between
+    the two lowest values can close by at most that much per simulation.
     """
-    copyBoard = copy.deepcopy(board)
-    rootNode = Node(copyBoard, tile, None, C)
-    for i in range(numSimulations):
+    if len(rootNode.children) < 2 or not rootNode.is_fully_expanded():
+        return False
+    values = sorted(child.value for child in rootNode.children.values())
+    return values[1] - values[0] > remainingSimulations * playoutsPerSimulation
+
+def runSimulations(rootNode, numSimulations, playout, deadline=None, cancel=None, stopEarly=False,
+                   playoutsPerLeaf=BATCH_PLAYOUTS):
+    """
+    Runs iterations of MCTS (selection, expansion, playout, backpropagation) from rootNode until numSimulations have
+    been run (no limit if None), the deadline (a time.time() value) has passed or cancel (e.g. a threading.Event) is
+    set, whichever comes first; at least one is run unless the result at the root is proven, which also stops the
+    search. With stopEarly it also stops once the leading root child cannot be overtaken in the simulations left,
+    estimated from the rate so far when there is a deadline.
+    With the 'BatchRandom' playout policy each simulation runs playoutsPerLeaf random playouts from the leaf at once.
+    Returns the number of simulations run; see also mctsStats.
+    """
+    if playout == 'BatchRandom':
+        from batch_playouts import batchRandomPlayouts # needs NumPy, so only imported when used
+    playoutsPerSimulation = playoutsPerLeaf if playout == 'BatchRandom' else 1
+    start = time.time()
+    i = 0
+    stopReason = 'budget'
+    while numSimulations is None or i < numSimulations:
+        if rootNode.proven is not None:
+            stopReason = 'proven'
+            break
+        if i > 0:
+            now = time.time()
+            if deadline is not None and now >= deadline:
+                stopReason = 'deadline'
+                break
+            if cancel is not None and cancel.is_set():
+                stopReason = 'cancelled'
+                break
+            if stopEarly:
+                remaining = float("inf") if numSimulations is None else numSimulations - i
+                if deadline is not None:
+                    remaining = min(remaining, (deadline - now) * i / max(now - start, 1e-9))
+                if leaderIsDecided(rootNode, remaining, playoutsPerSimulation):
+                    stopReason = 'decided'
+                    break
         node = rootNode # Start at the top of the tree each time, traversing down the tree using UCB1.
         while not node.is_end():
             if node.is_fully_expanded():
@@ -171,8 +288,106 @@ def MCTS(board, tile, numSimulations, C=4, playout='DynamicRoxanne3'):
             else:  # This else statement ensures that we explore all child nodes once before going deeper.
                 node = node.expand()
                 break
-        playoutResult = Playout(node.board, node.tile, playout)
-        node.back_propagate(playoutResult)
-        
-    bestMove = min(rootNode.children, key=lambda x: rootNode.children[x].value)
-    return bestMove
\ No newline at end of file
+        if playout == 'BatchRandom':
+            if node.is_end():
+                counts = [playoutsPerLeaf if node.winner == winner else 0 for winner in ('WHITE', 'BLACK', 'TIE')]
+            else:
+                counts = batchRandomPlayouts(node.board, node.tile, playoutsPerLeaf)
+            node.back_propagate_counts(*counts)
+        else:
+            if node.is_end():
+                playoutResult = node.winner
+            else:
+                playoutResult = Playout(node.board, node.tile, playout)
+            node.back_propagate(playoutResult)
+        if node.is_end():
+            # Pass the proof of the result up the tree as far as it goes.
+            while node is not None and node.update_proof():
+                node = node.parent
+        i += 1
+    mctsStats['simulations'] = i
+    mctsStats['playouts'] = i * playoutsPerSimulation
+    mctsStats['seconds'] = time.time() - start
+    mctsStats['stopReason'] = stopReason
+    return i
+
+def bestRootMove(rootNode):
+    # The move to the child with the lowest value, i.e. the best one for the player at the root. A move proven to win
+    # is always chosen, and moves proven to lose are avoided when there is anything else.
+    results = {move: rootNode.child_result(child) for move, child in rootNode.children.items()}
+    for move in results:
+        if results[move] == PROVEN_WIN:
+            return move
+    moves = [move for move in results if results[move] != PROVEN_LOSS] or list(results)
+    return min(moves, key=lambda x: rootNode.children[x].value)
+
+def MCTS(board, tile, numSimulations, C=4, playout='DynamicRoxanne3', endgameEmpties=ENDGAME_EMPTIES, timeLimit=None,
+         cancel=None, stopEarly=False, playoutsPerLeaf=BATCH_PLAYOUTS):
+    """
+    Takes the current board state as the root node of the game tree and then runs the MCTS algorithm. Returns the best 
+    move found. With endgameEmpties or fewer empty squares left, the exact endgame solver is used instead.
+    For an anytime search give a timeLimit in seconds and/or a cancel event, with numSimulations None or as a cap; the
+    best move so far is returned when time runs out or cancel is set. See runSimulations for stopEarly and
+    playoutsPerLeaf.
+    """
+    if countEmpties(board) <= endgameEmpties:
+        return tuple(endgameMove(board, tile)[0])
+    copyBoard = copy.deepcopy(board)
+    rootNode = Node(copyBoard, tile, None, C)
+    deadline = None if timeLimit is None else time.time() + timeLimit
+    runSimulations(rootNode, numSimulations, playout, deadline, cancel, stopEarly, playoutsPerLeaf)
+    return bestRootMove(rootNode)
+
+class MCTSSearcher:
+    """
+    MCTS which keeps its tree from one move to the next. Each call to move looks for the new position among the nodes
+    just below the old root (the moves played since, including passes) and makes that node the root, keeping the visits
+    and values of its subtree; the rest of the old tree is dropped. Use one MCTSSearcher per player per game.
+    """
+    # How many plies below the old root to look for the new position: our move, then the opponent's reply, plus a
+    # pass on either side.
+    REROOT_DEPTH = 4
+
+    def __init__(self, C=4, playout='DynamicRoxanne3', endgameEmpties=ENDGAME_EMPTIES, playoutsPerLeaf=BATCH_PLAYOUTS):
+        self.C = C
+        self.playout = playout
+        self.playoutsPerLeaf = playoutsPerLeaf
+        self.endgameEmpties = endgameEmpties
+        self.root = None
+        self.reusedVisits = 0 # visits of the subtree kept at the last call to move
+
+    def newGame(self):
+        self.root = None
+        self.reusedVisits = 0
+
+    def findNode(self, board, tile):
+        # Breadth first search of the top of the tree for the given position, returning None if it isn't there.
+        nodes = [self.root] if self.root is not None else []
+        for depth in range(self.REROOT_DEPTH + 1):
+            for node in nodes:
+                if node.tile == tile and node.board == board:
+                    return node
+            nodes = [child for node in nodes for child in node.children.values()]
+        return None
+
+    def reroot(self, board, tile):
+        # Makes the node for this position the root, or starts a new tree if it wasn't searched before.
+        node = self.findNode(board, tile)
+        if node is None:
+            node = Node(copy.deepcopy(board), tile, None, self.C)
+        node.parent = None # lets the rest of the old tree be freed
+        self.root = node
+        self.reusedVisits = node.visits
+
+    def move(self, board, tile, numSimulations, timeLimit=None, cancel=None, stopEarly=False):
+        """
+        Same as MCTS(board, tile, numSimulations, C, playout, endgameEmpties, timeLimit, cancel, stopEarly), but reusing
+        the tree from earlier calls.
+        """
+        deadline = None if timeLimit is None else time.time() + timeLimit
+        if countEmpties(board) <= self.endgameEmpties:
+            self.newGame()
+            return tuple(endgameMove(board, tile)[0])
+        self.reroot(board, tile)
+        runSimulations(self.root, numSimulations, self.playout, deadline, cancel, stopEarly, self.playoutsPerLeaf)
+        return bestRootMove(self.root)
@@ -1,14 +1,41 @@
 from board_functions import *
-import sys, copy
+import sys, copy, time
+from bitboard import FULL_MASK, popcount
+from endgame import ENDGAME_EMPTIES, countEmpties, endgameMove
+from move_ordering import MoveOrderer, ROXANNE_ORDERING_TABLES, getCornerState
+from transposition import TranspositionTable, computeHash, hashAfterMove, hashAfterPass, EXACT, LOWER, UPPER
 
 WHITE_TILE = 'WHITE_TILE' # an arbitrary but unique value
 BLACK_TILE = 'BLACK_TILE' # an arbitrary but unique value
 EMPTY_SPACE = 'EMPTY_SPACE' # an arbitrary but unique value
 
+class SearchTimeout(Exception):
+    # Raised inside minimax when the deadline of a timed search has passed.
+    pass
+
+# Counters for the most recent searches. 'nodes' counts calls to minimax/pvs (reset it with resetSearchStats()), 'depth'
+# is the last depth completed by iterativeDeepeningMove and 'aspirationResearches' counts aspiration window misses.
+searchStats = {'nodes': 0, 'depth': None, 'aspirationResearches': 0}
+
+def resetSearchStats():
+    searchStats['nodes'] = 0
+    searchStats['aspirationResearches'] = 0
+
+# Optional function called every 256 nodes, as often as the deadline is checked. parallel_search sets it in its worker
+# processes to stop a search by raising an exception when another worker has found a better root move.
+boundCheck = None
+
+# Width of the null windows used by pvs. Evaluation scores are floats, so any small positive width will do.
+NULL_WINDOW = 1e-6
+
+# Default half-width of the aspiration window used by iterativeDeepeningMove with 'pvs', in evaluation units. One
+# corner in evaluation3 is worth around 1000*25.
+ASPIRATION_WINDOW = 2000
+
 # minimax tree search algorithm: here white is the maximising player and black is the minimising player
 # depth is the search depth remaining, decremented for recursive calls
 # alpha and beta are the bounds on viable play values used in alpha-beta pruning
-def minimax(board, depth, tile, alpha, beta, evaluation):
+def minimax(board, depth, tile, alpha, beta, evaluation, table=None, key=None, deadline=None, orderer=None, ply=0):
     """
     Minimax function which searches game tree of a given depth. It returns the value of the best move according to an evaluation 
     function. 
@@ -20,94 +47,407 @@ def minimax(board, depth, tile, alpha, beta, evaluation):
         alpha: 'alpha' parameter in alpha-beta pruning
         beta: 'beta' parameter in alpha-beta pruning
         evaluation: the evaluation function used to evaluate the board state at depth 0
+        table: optional TranspositionTable (see transposition.py) used to look up positions that have already been
+            searched through a different move order
+        key: Zobrist hash of the position, updated incrementally as the search goes down the tree. Worked out from the
+            board if not given.
+        deadline: optional time.time() value; SearchTimeout is raised once it has passed. The board is left part way
+            through the search when that happens, so search a copy.
+        orderer: optional MoveOrderer (see move_ordering.py) for killer/history move ordering. Without one, moves are
+            ordered by orderMoves with the transposition table move first.
+        ply: number of moves from the root, used to look up killer moves
 
     Returns:
         A number (usually a float) which indicates who is winning the game assuming optimal play for both players after searching
         through the game tree down to the specified depth.
     """
-    # Firstly check whether the game has ended as of the most recent move; then can give definite valuation:
-    gameState = checkGameOver(board)
-    if gameState == 'WHITE':
-        return sys.maxsize # return arbitrarily large value so that we know we have found a winning/losing sequence of moves.
-    elif gameState == 'BLACK':
-        return -sys.maxsize
-    elif gameState == 'TIE':
-        return 0 
-    else:
-        pass # No game condition met, continue searching down the decision tree.
+    searchStats['nodes'] += 1
+    if searchStats['nodes'] % 256 == 0:
+        if deadline is not None and time.time() > deadline:
+            raise SearchTimeout()
+        if boundCheck is not None:
+            boundCheck()
+    ttMove = None
+    if table is not None and depth > 0:
+        if key is None:
+            key = computeHash(board, tile)
+        entry = table.probe(key)
+        if entry is not None:
+            ttDepth, bound, ttScore, ttMove = entry
+            if ttDepth >= depth:
+                if bound == EXACT:
+                    return ttScore
+                elif bound == LOWER:
+                    alpha = max(alpha, ttScore)
+                else:
+                    beta = min(beta, ttScore)
+                if beta <= alpha:
+                    return ttScore
+        alphaOriginal, betaOriginal = alpha, beta
+
+    # Firstly check whether the game has ended as of the most recent move; then can give definite valuation. Both
+    # sides' moves come from a single pass over the board and are reused below.
+    whiteMoves, blackMoves = getValidMovesForBothSides(board)
+    if not whiteMoves and not blackMoves:
+        gameState = declareWinner(board)
+        if gameState == 'WHITE':
+            return sys.maxsize # return arbitrarily large value so that we know we have found a winning/losing sequence of moves.
+        elif gameState == 'BLACK':
+            return -sys.maxsize
+        else:
+            return 0
     if depth == 0: # recursion base case
         return evaluation(board) # eval function which returns board value.
 
+    bestMove = None
     # While recursion occurs: function alternates between going through the if BLACK_TILE and if WHITE_TILE code
     if tile == WHITE_TILE:
         maxScore = -sys.maxsize # initialise with worst possible score
-        possibleMoves = getValidMoves(board, tile)
-        possibleMoves = orderMoves(board, possibleMoves) # Roughly order moves to speed up alpha-beta pruning
-        if possibleMoves == []:
+        if not whiteMoves:
             # If at some point during the game tree search, we find that we have no more moves, have to change 
             # tiles and then let the opponent play all their possible moves, then we continue once we again have some 
             # valid moves.
-            maxScore = minimax(board, depth, BLACK_TILE, alpha, beta, evaluation)
+            maxScore = minimax(board, depth, BLACK_TILE, alpha, beta, evaluation, table,
+                               None if key is None else hashAfterPass(key), deadline, orderer, ply)
         else:
-            for x, y in possibleMoves:
-                dupeBoard = copy.deepcopy(board)
-                makeMove(dupeBoard, tile, x, y) # Get the new board state
-                score = minimax(dupeBoard, depth - 1, BLACK_TILE, alpha, beta, evaluation)
+            # Roughly order moves to speed up alpha-beta pruning
+            possibleMoves = orderSearchMoves(board, tile, ttMove, orderer, ply)
+            for index, (move, flips) in enumerate(possibleMoves):
+                undo = applyMove(board, tile, move, flips) # Get the new board state
+                score = minimax(board, depth - 1, BLACK_TILE, alpha, beta, evaluation, table,
+                                None if key is None else hashAfterMove(key, tile, move, flips), deadline,
+                                orderer, ply + 1)
+                unmakeMove(board, undo) # and put the board back the way it was
+                if score > maxScore or bestMove is None:
+                    bestMove = move
                 maxScore = max(maxScore, score)
                 alpha = max(alpha, maxScore)
                 if beta <= alpha:
+                    if orderer is not None:
+                        orderer.recordCutoff(tile, move, ply, depth, index, ttMove)
                     break
-        return maxScore
+        score = maxScore
     
     else: # i.e. if black's turn
         # Symmetric to above code
         minScore = sys.maxsize
-        possibleMoves = getValidMoves(board, tile)
-        possibleMoves = orderMoves(board, possibleMoves)
-        if possibleMoves == []:
-            minScore = minimax(board, depth, WHITE_TILE, alpha, beta, evaluation)
+        if not blackMoves:
+            minScore = minimax(board, depth, WHITE_TILE, alpha, beta, evaluation, table,
+                               None if key is None else hashAfterPass(key), deadline, orderer, ply)
         else:
-            for x, y in possibleMoves:
-                dupeBoard = copy.deepcopy(board)
-                makeMove(dupeBoard, tile, x, y) # Get the new board state
-                score = minimax(dupeBoard, depth - 1, WHITE_TILE, alpha, beta, evaluation)
+            possibleMoves = orderSearchMoves(board, tile, ttMove, orderer, ply)
+            for index, (move, flips) in enumerate(possibleMoves):
+                undo = applyMove(board, tile, move, flips) # Get the new board state
+                score = minimax(board, depth - 1, WHITE_TILE, alpha, beta, evaluation, table,
+                                None if key is None else hashAfterMove(key, tile, move, flips), deadline,
+                                orderer, ply + 1)
+                unmakeMove(board, undo) # and put the board back the way it was
+                if score < minScore or bestMove is None:
+                    bestMove = move
                 minScore = min(minScore, score)
                 beta = min(beta, minScore)
                 if beta <= alpha:
+                    if orderer is not None:
+                        orderer.recordCutoff(tile, move, ply, depth, index, ttMove)
                     break
-        return minScore
+        score = minScore
+
+    if table is not None:
+        if score <= alphaOriginal:
+            bound = UPPER
+        elif score >= betaOriginal:
+            bound = LOWER
+        else:
+            bound = EXACT
+        table.store(key, depth, bound, score, bestMove)
+    return score
     
-def minimaxMove(board, depth, tile, alpha, beta, evaluation):
-    # Returns the move which has the best value according to minimax algorithm. White is the max player, black is the min.
+def pvs(board, depth, tile, alpha, beta, evaluation, table=None, key=None, deadline=None, orderer=None, ply=0):
+    """
+    Principal variation search (NegaScout). Takes the same arguments and returns the same kind of value as minimax, and
+    can be used in its place. The first (best ordered) move at each node is searched with the full (alpha, beta)
+    window; every other move is only tested with a null window to show it is no better, and is searched again with a
+    wider window if that test fails. With good move ordering most of those tests succeed and are much cheaper than a
+    full search.
+    """
+    searchStats['nodes'] += 1
+    if searchStats['nodes'] % 256 == 0:
+        if deadline is not None and time.time() > deadline:
+            raise SearchTimeout()
+        if boundCheck is not None:
+            boundCheck()
+    ttMove = None
+    if table is not None and depth > 0:
+        if key is None:
+            key = computeHash(board, tile)
+        entry = table.probe(key)
+        if entry is not None:
+            ttDepth, bound, ttScore, ttMove = entry
+            if ttDepth >= depth:
+                if bound == EXACT:
+                    return ttScore
+                elif bound == LOWER:
+                    alpha = max(alpha, ttScore)
+                else:
+                    beta = min(beta, ttScore)
+                if beta <= alpha:
+                    return ttScore
+        alphaOriginal, betaOriginal = alpha, beta
+
+    whiteMoves, blackMoves = getValidMovesForBothSides(board)
+    if not whiteMoves and not blackMoves:
+        gameState = declareWinner(board)
+        if gameState == 'WHITE':
+            return sys.maxsize
+        elif gameState == 'BLACK':
+            return -sys.maxsize
+        else:
+            return 0
+    if depth == 0:
+        return evaluation(board)
+
+    bestMove = None
+    if tile == WHITE_TILE:
+        maxScore = -sys.maxsize
+        if not whiteMoves:
+            maxScore = pvs(board, depth, BLACK_TILE, alpha, beta, evaluation, table,
+                           None if key is None else hashAfterPass(key), deadline, orderer, ply)
+        else:
+            possibleMoves = orderSearchMoves(board, tile, ttMove, orderer, ply)
+            for index, (move, flips) in enumerate(possibleMoves):
+                undo = applyMove(board, tile, move, flips)
+                childKey = None if key is None else hashAfterMove(key, tile, move, flips)
+                if bestMove is None or isMateScore(alpha):
+                    score = pvs(board, depth - 1, BLACK_TILE, alpha, beta, evaluation, table, childKey,
+                                deadline, orderer, ply + 1)
+                else:
+                    # Can this move do better than alpha? If so, find out by how much.
+                    score = pvs(board, depth - 1, BLACK_TILE, alpha, alpha + NULL_WINDOW, evaluation, table, childKey,
+                                deadline, orderer, ply + 1)
+                    if alpha < score < beta:
+                        score = pvs(board, depth - 1, BLACK_TILE, score, beta, evaluation, table, childKey,
+                                    deadline, orderer, ply + 1)
+                unmakeMove(board, undo)
+                if score > maxScore or bestMove is None:
+                    bestMove = move
+                maxScore = max(maxScore, score)
+                alpha = max(alpha, maxScore)
+                if beta <= alpha:
+                    if orderer is not None:
+                        orderer.recordCutoff(tile, move, ply, depth, index, ttMove)
+                    break
+        score = maxScore
+
+    else:
+        minScore = sys.maxsize
+        if not blackMoves:
+            minScore = pvs(board, depth, WHITE_TILE, alpha, beta, evaluation, table,
+                           None if key is None else hashAfterPass(key), deadline, orderer, ply)
+        else:
+            possibleMoves = orderSearchMoves(board, tile, ttMove, orderer, ply)
+            for index, (move, flips) in enumerate(possibleMoves):
+                undo = applyMove(board, tile, move, flips)
+                childKey = None if key is None else hashAfterMove(key, tile, move, flips)
+                if bestMove is None or isMateScore(beta):
+                    score = pvs(board, depth - 1, WHITE_TILE, alpha, beta, evaluation, table, childKey,
+                                deadline, orderer, ply + 1)
+                else:
+                    # Can this move do better (for black) than beta?
+                    score = pvs(board, depth - 1, WHITE_TILE, beta - NULL_WINDOW, beta, evaluation, table, childKey,
+                                deadline, orderer, ply + 1)
+                    if alpha < score < beta:
+                        score = pvs(board, depth - 1, WHITE_TILE, alpha, score, evaluation, table, childKey,
+                                    deadline, orderer, ply + 1)
+                unmakeMove(board, undo)
+                if score < minScore or bestMove is None:
+                    bestMove = move
+                minScore = min(minScore, score)
+                beta = min(beta, minScore)
+                if beta <= alpha:
+                    if orderer is not None:
+                        orderer.recordCutoff(tile, move, ply, depth, index, ttMove)
+                    break
+        score = minScore
+
+    if table is not None:
+        if score <= alphaOriginal:
+            bound = UPPER
+        elif score >= betaOriginal:
+            bound = LOWER
+        else:
+            bound = EXACT
+        table.store(key, depth, bound, score, bestMove)
+    return score
+
+def isMateScore(bound):
+    # True for the win/loss scores (and the infinite initial bounds), where a null window can't be placed next to the
+    # bound because adding NULL_WINDOW to it is lost in rounding.
+    return bound == float("inf") or bound == float("-inf") or abs(bound) >= sys.maxsize
+
+def searchRoot(board, depth, tile, alpha, beta, evaluation, table=None, deadline=None, algorithm='alphabeta',
+               orderer=None):
+    """
+    Searches every move from the root and returns (bestMove, value), where bestMove is [x, y] and value is the
+    minimax value (white positive). See minimaxMove for the arguments.
+
+    With algorithm='alphabeta' every root move is searched with the (alpha, beta) window it is given, using minimax.
+    With algorithm='pvs' the search uses pvs, and the window narrows as better root moves are found, so all but the
+    first root move only get a null-window test.
+    """
+    if algorithm == 'pvs':
+        search = pvs
+    elif algorithm == 'alphabeta':
+        search = minimax
+    else:
+        raise Exception("Invalid search algorithm selected. Choose 'alphabeta' or 'pvs'.")
     bestMaxValue = float("-inf")
     bestMinValue = float("inf")
-    possibleMoves = getValidMoves(board, tile)
-    possibleMoves = orderMoves(board, possibleMoves)
-    for x, y in possibleMoves:
-        # Think have to redefine board on each iteration to reset the board back to the root node of the tree.
-        dupeBoard = copy.deepcopy(board)
-        makeMove(dupeBoard, tile, x, y) # Make the move and then go into the tree
-        # Opponent makes the next move
-        opponentTile = list(set([BLACK_TILE, WHITE_TILE]) - set([str(tile)]))[0] # Needs to be str, not in ' '
-        moveValue = minimax(dupeBoard, depth, opponentTile, alpha, beta, evaluation) # Apply minimax algorithm
+    alphaOriginal, betaOriginal = alpha, beta
+    key = None
+    ttMove = None
+    if table is not None:
+        table.newSearch()
+        key = computeHash(board, tile)
+        entry = table.probe(key)
+        if entry is not None:
+            ttMove = entry[3]
+    possibleMoves = orderSearchMoves(board, tile, ttMove, orderer, 0)
+    # Opponent makes the next move
+    opponentTile = list(set([BLACK_TILE, WHITE_TILE]) - set([str(tile)]))[0] # Needs to be str, not in ' '
+    bestMove = None
+    for (x, y), flips in possibleMoves:
+        undo = applyMove(board, tile, (x, y), flips) # Make the move and then go into the tree
+        childKey = None if key is None else hashAfterMove(key, tile, (x, y), flips)
+        if algorithm == 'alphabeta' or bestMove is None:
+            moveValue = search(board, depth, opponentTile, alpha, beta, evaluation, table, childKey,
+                               deadline, orderer, 1) # Apply minimax algorithm
+        elif tile == WHITE_TILE:
+            if isMateScore(alpha):
+                moveValue = pvs(board, depth, opponentTile, alpha, beta, evaluation, table, childKey,
+                                deadline, orderer, 1)
+            else:
+                moveValue = pvs(board, depth, opponentTile, alpha, alpha + NULL_WINDOW, evaluation, table, childKey,
+                                deadline, orderer, 1)
+                if alpha < moveValue < beta:
+                    moveValue = pvs(board, depth, opponentTile, moveValue, beta, evaluation, table, childKey,
+                                    deadline, orderer, 1)
+        else:
+            if isMateScore(beta):
+                moveValue = pvs(board, depth, opponentTile, alpha, beta, evaluation, table, childKey,
+                                deadline, orderer, 1)
+            else:
+                moveValue = pvs(board, depth, opponentTile, beta - NULL_WINDOW, beta, evaluation, table, childKey,
+                                deadline, orderer, 1)
+                if alpha < moveValue < beta:
+                    moveValue = pvs(board, depth, opponentTile, alpha, moveValue, evaluation, table, childKey,
+                                    deadline, orderer, 1)
+        unmakeMove(board, undo) # Reset the board back to the root node of the tree.
         if tile == WHITE_TILE:
-            if moveValue > bestMaxValue:
+            if moveValue > bestMaxValue or bestMove is None:
                 bestMove = [x, y]
                 bestMaxValue = moveValue
+                if algorithm == 'pvs':
+                    alpha = max(alpha, moveValue)
         else:
-            if moveValue < bestMinValue:
+            if moveValue < bestMinValue or bestMove is None:
                 bestMove = [x, y]
                 bestMinValue = moveValue
-    return bestMove
+                if algorithm == 'pvs':
+                    beta = min(beta, moveValue)
+    value = bestMaxValue if tile == WHITE_TILE else bestMinValue
+    if table is not None:
+        if value <= alphaOriginal:
+            bound = UPPER
+        elif value >= betaOriginal:
+            bound = LOWER
+        else:
+            bound = EXACT
+        table.store(key, depth + 1, bound, value, tuple(bestMove))
+    return bestMove, value
+
+def minimaxMove(board, depth, tile, alpha, beta, evaluation, table=None, deadline=None, endgameEmpties=ENDGAME_EMPTIES,
+                algorithm='alphabeta', orderer=None, searcher=None):
+    # Returns the move which has the best value according to minimax algorithm. White is the max player, black is the min.
+    # If a TranspositionTable is given it is shared by the whole search (and can be kept between moves).
+    # With endgameEmpties or fewer empty squares left the exact endgame solver picks the move instead (0 turns this off).
+    # algorithm is 'alphabeta' (minimax) or 'pvs'; see searchRoot. orderer is an optional MoveOrderer.
+    # searcher is an optional parallel_search.ParallelSearcher which searches the root moves in worker processes
+    # instead; it always uses the full window and its own tables, so alpha, beta, table, deadline and orderer are unused.
+    if countEmpties(board) <= endgameEmpties:
+        return endgameMove(board, tile)[0]
+    if searcher is not None:
+        return searcher.move(board, depth, tile, evaluation, algorithm)
+    if orderer is not None:
+        orderer.newSearch()
+    return searchRoot(board, depth, tile, alpha, beta, evaluation, table, deadline, algorithm, orderer)[0]
     
+def iterativeDeepeningMove(board, tile, evaluation, timeLimit, maxDepth=None, table=None, endgameEmpties=ENDGAME_EMPTIES,
+                           algorithm='alphabeta', aspirationWindow=ASPIRATION_WINDOW, orderer=None):
+    """
+    Searches with minimaxMove at depth 0, 1, 2, ... until timeLimit seconds have passed (or maxDepth has been
+    searched) and returns the best move of the deepest search that finished. The transposition table carries the
+    best moves of each iteration over to the next one, so they are searched first.
+
+    Args:
+        board: 2D array containing the current board state (not modified)
+        tile: the colour of the player to move
+        evaluation: the evaluation function used at the leaves
+        timeLimit: time budget in seconds
+        maxDepth: optional largest depth to search
+        table: optional TranspositionTable, which can be kept between moves. A new one is made if not given.
+        endgameEmpties: with this many empty squares or fewer the endgame solver is used instead (see endgame.py)
+        algorithm: 'alphabeta' or 'pvs' (see searchRoot)
+        aspirationWindow: with 'pvs', each iteration after the first is searched with a window this wide either side
+            of the previous iteration's value, and searched again with the full window if the value falls outside it.
+            None turns this off.
+        orderer: optional MoveOrderer, which can be kept between moves. A new one is made if not given.
+
+    Returns:
+        The best move as [x, y]. searchStats['depth'] is set to the depth of the last search that finished.
+    """
+    empties = countEmpties(board)
+    if empties <= endgameEmpties:
+        return endgameMove(board, tile)[0]
+    deadline = time.time() + timeLimit
+    if table is None:
+        table = TranspositionTable()
+    if orderer is None:
+        orderer = MoveOrderer()
+    orderer.newSearch()
+    searchBoard = copy.deepcopy(board) # A timed out search leaves moves on the board, so don't search the original.
+    # Until the first search finishes, fall back on the first move in the usual order.
+    bestMove = list(orderMovesWithFlips(board, list(generateMovesWithFlips(board, tile)))[0][0])
+    searchStats['depth'] = None
+    depth = 0
+    value = None
+    while maxDepth is None or depth <= maxDepth:
+        try:
+            if algorithm == 'pvs' and aspirationWindow is not None and value is not None and not isMateScore(value):
+                alpha, beta = value - aspirationWindow, value + aspirationWindow
+                move, value = searchRoot(searchBoard, depth, tile, alpha, beta, evaluation, table, deadline, algorithm,
+                                         orderer)
+                if value <= alpha or value >= beta: # outside the window, so only a bound: search again properly
+                    searchStats['aspirationResearches'] += 1
+                    move, value = searchRoot(searchBoard, depth, tile, float("-inf"), float("inf"), evaluation, table,
+                                             deadline, algorithm, orderer)
+            else:
+                move, value = searchRoot(searchBoard, depth, tile, float("-inf"), float("inf"), evaluation, table,
+                                         deadline, algorithm, orderer)
+        except SearchTimeout:
+            break
+        bestMove = move
+        searchStats['depth'] = depth
+        # minimaxMove at depth d looks d + 1 moves ahead; there is nothing more to find once that covers every empty square.
+        if depth + 1 >= empties or time.time() > deadline:
+            break
+        depth += 1
+    return bestMove
+
 def checkGameOver(board):
     # Function which checks whether the game is over. Returns the winner as a string.
     # The game is over if neither player has any valid moves.
-    whiteMoves = getValidMoves(board, WHITE_TILE)
-    if whiteMoves: # this checks for an empty list
-        return 'NOBODY'
-    blackMoves = getValidMoves(board, BLACK_TILE)
-    if blackMoves:
+    whiteMoves, blackMoves = getValidMovesForBothSides(board)
+    if whiteMoves or blackMoves: # this checks for empty lists
         return 'NOBODY'
     # If make it this far then neither player has any moves
     return declareWinner(board)
@@ -135,42 +475,34 @@ def orderMoves(board, movesList):
     This function estimates which moves will be best by ordering them based on DynamicRoxanne3's gameplay strategy. I.e.
     order the moves in the order that DynamicRoxanne3 would play.
     """
-    originalRoxanneMatrix = [[1,5,3,3,3,3,5,1],
-                [5,5,4,4,4,4,5,5],
-                [3,4,2,2,2,2,4,3],
-                [3,4,2,9,9,2,4,3],
-                [3,4,2,9,9,2,4,3],
-                [3,4,2,2,2,2,4,3],
-                [5,5,4,4,4,4,5,5],
-                [1,5,3,3,3,3,5,1]]
-    
-    if board[0][0] is not 'EMPTY_SPACE':
-        originalRoxanneMatrix[0][1] = 2
-        originalRoxanneMatrix[1][1] = 2
-        originalRoxanneMatrix[1][0] = 2   
-    if board[7][0] is not 'EMPTY_SPACE':
-        originalRoxanneMatrix[6][0] = 2
-        originalRoxanneMatrix[7][1] = 2
-        originalRoxanneMatrix[6][1] = 2
-    if board[0][7] is not 'EMPTY_SPACE':
-        originalRoxanneMatrix[1][7] = 2
-        originalRoxanneMatrix[0][6] = 2
-        originalRoxanneMatrix[1][6] = 2
-    if board[7][7] is not 'EMPTY_SPACE':
-        originalRoxanneMatrix[7][6] = 2
-        originalRoxanneMatrix[6][7] = 2
-        originalRoxanneMatrix[6][6] = 2
+    # The priority matrix for each combination of occupied corners is built once in move_ordering.
+    roxanneMatrix = ROXANNE_ORDERING_TABLES[getCornerState(board)]
         
     # Just need to assign each move and index and then order the moves based on their assigned indices.
     assignments = {}
     for x, y in movesList:
         move = (x, y)
-        assignments[move] = originalRoxanneMatrix[x][y]
+        assignments[move] = roxanneMatrix[x][y]
         
     orderedMoves = dict(sorted(assignments.items(), key=lambda item: item[1]))
     # Fine to return a dictionary that has the Roxanne values; x, y in the for loop still gets the move coordinates.
     return orderedMoves
 
+def orderMovesWithFlips(board, movesWithFlips, firstMove=None):
+    # Same ordering as orderMoves, for the ((x, y), flips) pairs produced by generateMovesWithFlips. If firstMove is
+    # given (e.g. the best move from the transposition table) it is searched first.
+    priorities = orderMoves(board, [move for move, flips in movesWithFlips])
+    if firstMove is not None and firstMove in priorities:
+        priorities[firstMove] = 0
+    return sorted(movesWithFlips, key=lambda item: priorities[item[0]])
+
+def orderSearchMoves(board, tile, ttMove, orderer, ply):
+    # Generates the moves (with flips) at a search node and puts them in search order.
+    movesWithFlips = list(generateMovesWithFlips(board, tile))
+    if orderer is None:
+        return orderMovesWithFlips(board, movesWithFlips, ttMove)
+    return orderer.order(board, tile, movesWithFlips, ply, ttMove)
+
 def cornerOccupancy(board):
     # Heuristic function which returns the heuristic value based on which corners are occupied. Corners are good so this
     # should be positive for white, the max player in our case.
@@ -259,8 +591,9 @@ def cornerCloseness(board):
 def actualMobility(board):
     # Actual mobility is determined by the number of legal moves you have, so we look at the difference between the 
     # number of legal moves of the max player and that of the min player.
-    numWhiteMoves = len(getValidMoves(board, WHITE_TILE))
-    numBlackMoves = len(getValidMoves(board, BLACK_TILE))
+    whiteMoves, blackMoves = getValidMovesForBothSides(board)
+    numWhiteMoves = len(whiteMoves)
+    numBlackMoves = len(blackMoves)
     return 100*(numWhiteMoves - numBlackMoves)/(numWhiteMoves + numBlackMoves + 1)
 
 def potentialMobility(board):
@@ -472,107 +805,176 @@ def stability(board):
             
     return 100*(whiteStableDiscs - blackStableDiscs)/(whiteStableDiscs + blackStableDiscs + 1)
 
+# The fused evaluator. Rather than each heuristic above scanning the board separately (and actualMobility generating
+# both players' moves on top), extractFeatures converts the board to bitboards once and works out all six heuristics
+# and the tile count from them. The evaluation functions below are then just weights for each feature, which can
+# depend on the game phase.
+
+CORNERS_MASK = (1 << 0) | (1 << 7) | (1 << 56) | (1 << 63) # board[0][0], board[0][7], board[7][0], board[7][7]
+# Each corner with its three neighbouring squares, as checked by cornerCloseness.
+CORNER_NEIGHBOURS_MASKS = [(1 << 0, (1 << 1) | (1 << 8) | (1 << 9)),
+                           (1 << 7, (1 << 6) | (1 << 14) | (1 << 15)),
+                           (1 << 56, (1 << 57) | (1 << 48) | (1 << 49)),
+                           (1 << 63, (1 << 62) | (1 << 54) | (1 << 55))]
+
+def buildFrontierMasks():
+    # For each direction, the bit offset of the neighbour in that direction and the squares whose neighbour in that
+    # direction potentialMobility looks at: all 8 neighbours for the 4x4 interior, left and right for the rest of rows
+    # 1 and 6, up and down for the rest of columns 1 and 6.
+    masks = []
+    for dx, dy in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], [-1, 0], [-1, 1]]:
+        mask = 0
+        for x in range(2, 6):
+            for y in range(2, 6):
+                mask |= 1 << (x*8 + y)
+            if dy == 0:
+                mask |= (1 << (x*8 + 1)) | (1 << (x*8 + 6))
+        if dx == 0:
+            for y in range(2, 6):
+                mask |= (1 << (8 + y)) | (1 << (6*8 + y))
+        masks.append((dx*8 + dy, mask))
+    return masks
+
+FRONTIER_MASKS = buildFrontierMasks()
+
+# (edge row, order of rows, order of columns) for the scan from each corner in stability.
+STABILITY_SCANS = [(0, range(8), range(8)),
+                   (0, range(8), range(7, -1, -1)),
+                   (7, range(7, -1, -1), range(8)),
+                   (7, range(7, -1, -1), range(7, -1, -1))]
+
+def countStableDiscs(discs):
+    # The same count of discs made stable by the corners as stability(), for one colour's bitboard.
+    stableDiscs = 0
+    for edge, xs, ys in STABILITY_SCANS:
+        for y in ys:
+            if not (discs >> (edge*8 + y)) & 1:
+                break
+            for x in xs:
+                if (discs >> (x*8 + y)) & 1:
+                    stableDiscs += 1
+                else:
+                    break
+    return stableDiscs
+
+def extractFeatures(board):
+    """
+    Works out every heuristic in one go. Returns (numTiles, CO, CC, AM, PM, DD, S), where the last six are equal to
+    cornerOccupancy, cornerCloseness, actualMobility, potentialMobility, discDifference and stability of the board.
+    """
+    white, black = boardToBitboards(board)
+    empty = ~(white | black) & FULL_MASK
+
+    numWhite, numBlack = popcount(white), popcount(black)
+    DD = 100*(numWhite - numBlack)/(numBlack + numWhite + 1)
+
+    whiteCorners, blackCorners = popcount(white & CORNERS_MASK), popcount(black & CORNERS_MASK)
+    CO = 100*(whiteCorners - blackCorners)/(whiteCorners + blackCorners + 1)
+
+    whiteTiles, blackTiles = 0, 0
+    for corner, neighbours in CORNER_NEIGHBOURS_MASKS:
+        if empty & corner:
+            whiteTiles += popcount(white & neighbours)
+            blackTiles += popcount(black & neighbours)
+    CC = -100*(whiteTiles - blackTiles)/(whiteTiles + blackTiles + 1)
+
+    numWhiteMoves, numBlackMoves = popcount(getMovesMask(white, black)), popcount(getMovesMask(black, white))
+    AM = 100*(numWhiteMoves - numBlackMoves)/(numWhiteMoves + numBlackMoves + 1)
+
+    whiteMobility, blackMobility = 0, 0
+    for offset, mask in FRONTIER_MASKS:
+        # Squares in the mask whose neighbour in this direction is empty.
+        if offset > 0:
+            emptyNeighbour = (empty >> offset) & mask
+        else:
+            emptyNeighbour = (empty << -offset) & mask
+        whiteMobility += popcount(black & emptyNeighbour)
+        blackMobility += popcount(white & emptyNeighbour)
+    PM = 100*(whiteMobility - blackMobility)/(whiteMobility + blackMobility + 1)
+
+    if (white | black) & CORNERS_MASK:
+        whiteStableDiscs, blackStableDiscs = countStableDiscs(white), countStableDiscs(black)
+        S = 100*(whiteStableDiscs - blackStableDiscs)/(whiteStableDiscs + blackStableDiscs + 1)
+    else: # every scan starts from a corner
+        S = 0.0
+
+    return (numWhite + numBlack, CO, CC, AM, PM, DD, S)
+
+def weightedEvaluation(board, phases):
+    """
+    Evaluates the board as a weighted sum of the features from extractFeatures. phases is a list of
+    (maxTiles, (wCO, wCC, wAM, wPM, wDD, wS)): the first phase with at least as many tiles as are on the board is used.
+    """
+    numTiles, CO, CC, AM, PM, DD, S = extractFeatures(board)
+    for maxTiles, weights in phases:
+        if numTiles <= maxTiles:
+            break
+    wCO, wCC, wAM, wPM, wDD, wS = weights
+    return wCO*CO + wCC*CC + wAM*AM + wPM*PM + wDD*DD + wS*S
+
+# Weights of (CO, CC, AM, PM, DD, S) for each evaluation function, per game phase (see weightedEvaluation).
+EVALUATION2_WEIGHTS = [(64, (800, 400, 20, 20, 10, 500))] # weights based off both githubs
+EVALUATION3_WEIGHTS = [(20, (1000, 1000, 20, 10, 0, 1000)), # early game
+                       (58, (1000, 1000, 10, 5, 5, 1000)), # used to be 54
+                       (64, (1000, 1000, 0, 0, 500, 1000))]
+EVALUATION4_WEIGHTS = [(64, (15, 15, 2.5, 2.5, 25, 25))]
+EVALUATION5_WEIGHTS = [(64, (30, 30, 2.5, 2.5, 25, 25))]
+EVALUATION6_WEIGHTS = [(64, (30, 0, 2.5, 2.5, 25, 25))]
+EVALUATION7_WEIGHTS = [(20, (1000, 1000, 20, 20, 0, 1000)), # early game
+                       (54, (1000, 1000, 10, 10, 5, 1000)),
+                       (58, (1000, 1000, 0, 0, 500, 1000)),
+                       (64, (0, 0, 0, 0, 1, 0))]
+EVALUATION8_WEIGHTS = [(54, (1000, 1000, 20, 6, 4, 1000)),
+                       (64, (1000, 1000, 20, 6, 20, 1000))]
+
 def evaluation2(board):
     # generic evaluation function for use at all stages of the game (not optimal)
-    CO = cornerOccupancy(board)
-    CC = cornerCloseness(board)
-    AM = actualMobility(board)
-    PM = potentialMobility(board)
-    DD = discDifference(board)
-    S = stability(board)
-    
-    # weights based off both githubs
-    return 800*CO + 400*CC + 20*AM + 20*PM + 10*DD + 500*S
+    return weightedEvaluation(board, EVALUATION2_WEIGHTS)
 
 def evaluation3(board):
     # eval function which returns different evaluations for early, mid, and late game.
-    scores = getScoreOfBoard(board)
-    numTiles = scores['WHITE_TILE'] + scores['BLACK_TILE']
-    CO = cornerOccupancy(board)
-    CC = cornerCloseness(board)
-    AM = actualMobility(board)
-    PM = potentialMobility(board)
-    DD = discDifference(board)
-    S = stability(board)
     # Think about the heuristics; CO, CC and S will reduce to 0 on most board states as they involve corners.
-    if numTiles <= 20: # early game
-        return 1000*CO + 1000*CC + 20*AM + 10*PM + 1000*S
-    elif numTiles <= 58: # used to be 54
-        return 1000*CO + 1000*CC + 10*AM + 5*PM + 1000*S + 5*DD
-    else:
-        return 1000*CO + 1000*CC + 1000*S + 500*DD
+    return weightedEvaluation(board, EVALUATION3_WEIGHTS)
     
 def evaluation4(board):
     """
     This evaluation function is based on the results found in "An Analysis of Heuristics in Othello". 
     """
-    CO = cornerOccupancy(board)
-    CC = cornerCloseness(board)
-    AM = actualMobility(board)
-    PM = potentialMobility(board)
-    DD = discDifference(board)
-    S = stability(board)
-    
-    return 15*CO + 15*CC + 2.5*AM + 2.5*PM + 25*S + 25*DD
+    return weightedEvaluation(board, EVALUATION4_WEIGHTS)
 
 def evaluation5(board):
     """
     An eval function with corner closeness to be compared with one without it.
     """
-    CO = cornerOccupancy(board)
-    CC = cornerCloseness(board)
-    AM = actualMobility(board)
-    PM = potentialMobility(board)
-    DD = discDifference(board)
-    S = stability(board)
-    
-    return 30*CO + 30*CC + 2.5*AM + 2.5*PM + 25*S + 25*DD
+    return weightedEvaluation(board, EVALUATION5_WEIGHTS)
 
 def evaluation6(board):
     """
     Corner closeness is omitted to test its importance. 
     """
-    CO = cornerOccupancy(board)
-    CC = cornerCloseness(board)
-    AM = actualMobility(board)
-    PM = potentialMobility(board)
-    DD = discDifference(board)
-    S = stability(board)
-    
-    return 30*CO + 2.5*AM + 2.5*PM + 25*S + 25*DD
+    return weightedEvaluation(board, EVALUATION6_WEIGHTS)
 
 def evaluation7(board):
     # eval function which returns different evaluations for early, mid, and late game - different take on evaluation3.
-    scores = getScoreOfBoard(board)
-    numTiles = scores['WHITE_TILE'] + scores['BLACK_TILE']
-    CO = cornerOccupancy(board)
-    CC = cornerCloseness(board)
-    AM = actualMobility(board)
-    PM = potentialMobility(board)
-    DD = discDifference(board)
-    S = stability(board)
-
-    if numTiles <= 20: # early game
-        return 1000*CO + 1000*CC + 20*AM + 20*PM + 1000*S
-    elif numTiles <= 54:
-        return 1000*CO + 1000*CC + 10*AM + 10*PM + 1000*S + 5*DD
-    elif numTiles <= 58:
-        return 1000*CO + 1000*CC + 1000*S + 500*DD
-    else:
-        return DD
+    return weightedEvaluation(board, EVALUATION7_WEIGHTS)
     
 def evaluation8(board):
     # eval function which returns different evaluations for mid and late game.
+    return weightedEvaluation(board, EVALUATION8_WEIGHTS)
+
+def separateHeuristicsEvaluation(board, phases):
+    # weightedEvaluation computed the old way, calling each heuristic function in turn. Kept as the reference for
+    # benchmark_evaluation.py and for checking extractFeatures.
     scores = getScoreOfBoard(board)
     numTiles = scores['WHITE_TILE'] + scores['BLACK_TILE']
+    for maxTiles, weights in phases:
+        if numTiles <= maxTiles:
+            break
     CO = cornerOccupancy(board)
     CC = cornerCloseness(board)
     AM = actualMobility(board)
     PM = potentialMobility(board)
     DD = discDifference(board)
     S = stability(board)
-
-    if numTiles <= 54:
-        return 1000*CO + 1000*CC + 20*AM + 6*PM + 4*DD + 1000*S
-    else:
-        return 1000*CO + 1000*CC + 1000*S + 20*AM + 6*PM + 20*DD
\ No newline at end of file
+    wCO, wCC, wAM, wPM, wDD, wS = weights
+    return wCO*CO + wCC*CC + wAM*AM + wPM*PM + wDD*DD + wS*S
@@ -0,0 +1,147 @@
+# Move ordering for the alpha-beta searches in minimax.py. Alpha-beta prunes the most when the best move is searched
+# first, so moves are tried in this order:
+#   1. the best move stored in the transposition table for this position,
+#   2. the killer moves: moves which caused a cutoff at the same ply elsewhere in the tree,
+#   3. the rest, by history score (how often and how deep the move has caused cutoffs so far), ties broken by the
+#      static Roxanne priority of the square.
+
+from board_functions import EMPTY_SPACE, WHITE_TILE, BLACK_TILE
+from bitboard import coordsToSquare
+
+# Priority of moves according to the Roxanne method (lower is better), as in simple_agents.
+ROXANNE_MATRIX = [[1,5,3,3,3,3,5,1],
+                  [5,5,4,4,4,4,5,5],
+                  [3,4,2,2,2,2,4,3],
+                  [3,4,2,9,9,2,4,3],
+                  [3,4,2,9,9,2,4,3],
+                  [3,4,2,2,2,2,4,3],
+                  [5,5,4,4,4,4,5,5],
+                  [1,5,3,3,3,3,5,1]]
+
+# The four corners with their three neighbouring squares, in corner-state bit order.
+CORNERS = [((0, 0), [(0, 1), (1, 1), (1, 0)]),
+           ((7, 0), [(6, 0), (7, 1), (6, 1)]),
+           ((0, 7), [(1, 7), (0, 6), (1, 6)]),
+           ((7, 7), [(7, 6), (6, 7), (6, 6)])]
+
+def getCornerState(board, cornerTile=None):
+    # Returns a number from 0 to 15 with bit i set if corner i of CORNERS is occupied (by cornerTile if given, by
+    # either player otherwise).
+    state = 0
+    for bit, ((x, y), neighbours) in enumerate(CORNERS):
+        if (board[x][y] != EMPTY_SPACE) if cornerTile is None else (board[x][y] == cornerTile):
+            state |= 1 << bit
+    return state
+
+def buildRoxanneTables(neighbourPriority):
+    # Precomputes the Roxanne matrix for all 16 corner states, with the squares next to each occupied corner given
+    # neighbourPriority.
+    tables = []
+    for state in range(16):
+        matrix = [row[:] for row in ROXANNE_MATRIX]
+        for bit, (corner, neighbours) in enumerate(CORNERS):
+            if state & (1 << bit):
+                for x, y in neighbours:
+                    matrix[x][y] = neighbourPriority
+        tables.append(matrix)
+    return tables
+
+# The ordering used by minimax.orderMoves (DynamicRoxanne3's priorities), indexed by getCornerState(board).
+ROXANNE_ORDERING_TABLES = buildRoxanneTables(2)
+
+# Bit of each corner square in a bitboard, in corner-state bit order.
+CORNER_BITS = [1 << coordsToSquare(x, y) for (x, y), neighbours in CORNERS]
+
+def getCornerStateFromBitboard(discs):
+    # getCornerState for a bitboard: bit i set if corner i of CORNERS is one of the discs.
+    state = 0
+    for bit, cornerBit in enumerate(CORNER_BITS):
+        if discs & cornerBit:
+            state |= 1 << bit
+    return state
+
+def buildPriorityMasks(matrix):
+    # Turns a priority matrix into a list of bitboards, one per priority level from best to worst, each with the
+    # squares of that priority set.
+    masks = {}
+    for x in range(8):
+        for y in range(8):
+            masks[matrix[x][y]] = masks.get(matrix[x][y], 0) | (1 << coordsToSquare(x, y))
+    return [masks[priority] for priority in sorted(masks)]
+
+# Priority masks of the Roxanne matrix for each corner state, with the squares next to occupied corners given priority 2
+# (DynamicRoxanne v1 and v3) or 3 (v2 and v4).
+ROXANNE_PRIORITY_MASKS = {neighbourPriority: [buildPriorityMasks(matrix) for matrix in buildRoxanneTables(neighbourPriority)]
+                          for neighbourPriority in (2, 3)}
+
+# Number of killer moves kept per ply.
+NUM_KILLERS = 2
+
+class MoveOrderer:
+    """
+    Keeps the killer moves and history table for a search and orders moves with them. One MoveOrderer can be kept for
+    a whole game; call newSearch before each move so old history counts less.
+
+    Also counts cutoffs, so ordering quality can be measured: the closer firstMoveCutoffRate is to 1, the better.
+    """
+    def __init__(self):
+        self.killers = []
+        self.history = {WHITE_TILE: [[0] * 8 for i in range(8)], BLACK_TILE: [[0] * 8 for i in range(8)]}
+        self.resetStats()
+
+    def resetStats(self):
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.cutoffIndexTotal = 0
+        self.ttMoveCutoffs = 0
+        self.killerCutoffs = 0
+
+    def newSearch(self):
+        # Halves the history scores so that those from earlier moves of the game fade out. Killers are kept since the
+        # next search usually starts two plies further on.
+        for table in self.history.values():
+            for column in table:
+                for y in range(8):
+                    column[y] >>= 1
+        self.killers = self.killers[2:]
+
+    def order(self, board, tile, movesWithFlips, ply, ttMove=None):
+        # Sorts the ((x, y), flips) pairs from generateMovesWithFlips into search order.
+        static = ROXANNE_ORDERING_TABLES[getCornerState(board)]
+        history = self.history[tile]
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        def key(item):
+            x, y = item[0]
+            if item[0] == ttMove:
+                return (0, 0, 0)
+            if item[0] in killers:
+                return (1, 0, 0)
+            return (2, -history[x][y], static[x][y])
+        return sorted(movesWithFlips, key=key)
+
+    def recordCutoff(self, tile, move, ply, depth, index, ttMove=None):
+        # Called when 'move', the index-th move searched at this node, caused a beta cutoff.
+        self.cutoffs += 1
+        self.cutoffIndexTotal += index
+        if index == 0:
+            self.firstMoveCutoffs += 1
+        if move == ttMove:
+            self.ttMoveCutoffs += 1
+            return
+        while len(self.killers) <= ply:
+            self.killers.append([])
+        killers = self.killers[ply]
+        if move in killers:
+            self.killerCutoffs += 1
+        else:
+            killers.insert(0, move)
+            del killers[NUM_KILLERS:]
+        self.history[tile][move[0]][move[1]] += depth * depth
+
+    def stats(self):
+        return {'cutoffs': self.cutoffs,
+                'firstMoveCutoffs': self.firstMoveCutoffs,
+                'firstMoveCutoffRate': self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0,
+                'meanCutoffIndex': self.cutoffIndexTotal / self.cutoffs if self.cutoffs else 0.0,
+                'ttMoveCutoffs': self.ttMoveCutoffs,
+                'killerCutoffs': self.killerCutoffs}
@@ -0,0 +1,145 @@
+# Parallel MCTS on a pool of worker processes, in two flavours:
+#   'root': every worker grows its own tree from the root with its share of the simulations, and the statistics of the
+#           root's children are added up over all the trees at the end.
+#   'leaf': one tree is grown here, and for every leaf it selects, a playout is run in each worker at once and all
+#           the results are backpropagated.
+# Root parallelism needs almost no communication; leaf parallelism gives a single, better informed tree but waits for
+# the slowest playout of every batch.
+#
+# Run this file to benchmark simulations per second for 1..N workers, e.g. python parallel_mcts.py --workers 4
+
+import argparse, copy, json, multiprocessing, random, time
+from concurrent.futures import ProcessPoolExecutor
+from board_functions import *
+from mcts import Node, Playout, runSimulations
+from endgame import ENDGAME_EMPTIES, countEmpties, endgameMove
+
+MODES = ['root', 'leaf']
+
+def searchTree(board, tile, numSimulations, C, playout, seed):
+    """
+    Runs in a worker: grows a tree of numSimulations simulations from the board. Returns {move: (visits, value)} for
+    the children of the root.
+    """
+    random.seed(seed) # forked workers would otherwise all play the same playouts
+    rootNode = Node(board, tile, None, C)
+    runSimulations(rootNode, numSimulations, playout)
+    return {move: (child.visits, child.value) for move, child in rootNode.children.items()}
+
+def runPlayouts(board, tile, count, playout, seed):
+    # Runs in a worker: returns the winners of count playouts from the board.
+    random.seed(seed)
+    return [Playout(board, tile, playout) for i in range(count)]
+
+class ParallelMCTS:
+    """
+    A pool of worker processes for MCTS. Create one and reuse it for every move, since starting the processes is
+    slow; close it (or use it in a with statement) when finished.
+    """
+    def __init__(self, workers=None, mode='root', C=4, playout='DynamicRoxanne3', endgameEmpties=ENDGAME_EMPTIES):
+        if mode not in MODES:
+            raise Exception("Invalid parallel MCTS mode %r. Choose from %s." % (mode, MODES))
+        self.workers = workers or multiprocessing.cpu_count()
+        self.mode = mode
+        self.C = C
+        self.playout = playout
+        self.endgameEmpties = endgameEmpties
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.simulations = 0 # simulations run by the last call to move
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    def rootParallel(self, board, tile, numSimulations):
+        # Returns the merged {move: [visits, value]} of the root children of one tree per worker.
+        shares = [numSimulations // self.workers + (1 if i < numSimulations % self.workers else 0)
+                  for i in range(self.workers)]
+        futures = [self.executor.submit(searchTree, board, tile, share, self.C, self.playout, random.getrandbits(32))
+                   for share in shares if share]
+        totals = {}
+        for future in futures:
+            for move, (visits, value) in future.result().items():
+                total = totals.setdefault(move, [0, 0])
+                total[0] += visits
+                total[1] += value
+        self.simulations = sum(shares)
+        return totals
+
+    def leafParallel(self, board, tile, numSimulations):
+        # Grows one tree, running a batch of one playout per worker at each selected leaf.
+        rootNode = Node(copy.deepcopy(board), tile, None, self.C)
+        self.simulations = 0
+        while self.simulations < numSimulations:
+            node = rootNode
+            while not node.is_end():
+                if node.is_fully_expanded():
+                    node = node.select()
+                else:
+                    node = node.expand()
+                    break
+            batch = min(self.workers, numSimulations - self.simulations)
+            futures = [self.executor.submit(runPlayouts, node.board, node.tile, 1, self.playout, random.getrandbits(32))
+                       for i in range(batch)]
+            for future in futures:
+                for winner in future.result():
+                    node.back_propagate(winner)
+            self.simulations += batch
+        return {move: [child.visits, child.value] for move, child in rootNode.children.items()}
+
+    def move(self, board, tile, numSimulations):
+        """
+        Drop-in for mcts.MCTS(board, tile, numSimulations): returns the move to the root child with the lowest total
+        value, i.e. the best one for the player at the root.
+        """
+        if countEmpties(board) <= self.endgameEmpties:
+            self.simulations = 0
+            return tuple(endgameMove(board, tile)[0])
+        if self.mode == 'root':
+            totals = self.rootParallel(board, tile, numSimulations)
+        else:
+            totals = self.leafParallel(board, tile, numSimulations)
+        return min(totals, key=lambda move: totals[move][1])
+
+def benchmark(positions, numSimulations, maxWorkers, mode='root', playout='DynamicRoxanne3'):
+    """
+    Times numSimulations simulations from each (board, tile) position serially with mcts.runSimulations and then with
+    1..maxWorkers workers. Returns a list of result dicts, one per worker count (0 is serial).
+    """
+    results = []
+    start = time.time()
+    for board, tile in positions:
+        runSimulations(Node(copy.deepcopy(board), tile, None, 4), numSimulations, playout)
+    serialTime = time.time() - start
+    simulations = numSimulations * len(positions)
+    results.append({'workers': 0, 'mode': 'serial', 'seconds': serialTime, 'simulationsPerSecond': simulations / serialTime,
+                    'speedup': 1.0})
+    for workers in range(1, maxWorkers + 1):
+        with ParallelMCTS(workers, mode, playout=playout, endgameEmpties=0) as searcher:
+            searcher.move(positions[0][0], positions[0][1], workers) # start the processes
+            simulations = 0
+            start = time.time()
+            for board, tile in positions:
+                searcher.move(board, tile, numSimulations)
+                simulations += searcher.simulations
+            seconds = time.time() - start
+        results.append({'workers': workers, 'mode': mode, 'seconds': seconds,
+                        'simulationsPerSecond': simulations / seconds, 'speedup': serialTime / seconds})
+    return results
+
+if __name__ == '__main__':
+    from parallel_search import benchmarkPositions
+    parser = argparse.ArgumentParser(description='Benchmark simulations per second of parallel MCTS.')
+    parser.add_argument('--simulations', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--positions', type=int, default=3)
+    parser.add_argument('--mode', default='root', choices=MODES)
+    parser.add_argument('--playout', default='DynamicRoxanne3', choices=['DynamicRoxanne3', 'evaluation3', 'Random'])
+    args = parser.parse_args()
+    for result in benchmark(benchmarkPositions(args.positions), args.simulations, args.workers, args.mode, args.playout):
+        print(json.dumps(result))
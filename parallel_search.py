@@ -0,0 +1,206 @@
+# Parallel root search for minimax: the moves at the root are shared out between worker processes.
+# The first (best ordered) root move is searched on its own first ("Young Brothers Wait"), so that the rest of the root
+# moves start with a good bound. The bound is kept in shared memory and improved as results come back. Workers check it
+# every 256 nodes (through minimax.boundCheck) and restart a search that is still running with the narrower window
+# when it has improved. Each worker keeps its own transposition table between tasks, so a restart doesn't start over.
+#
+# Pass a ParallelSearcher to minimax.minimaxMove (searcher=...) to use it in a game, or use a minimax:...:parallel agent
+# in tournament.py.
+#
+# Run this file to benchmark 1..N workers, e.g. python parallel_search.py --depth 4 --workers 4. The speedup and the
+# nodes ratio are relative to one worker, which searches with the same root windows and tables, so they only show
+# what is gained (time) and lost (extra nodes searched) by running in parallel.
+
+import argparse, copy, json, multiprocessing, multiprocessing.util, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from board_functions import *
+import minimax
+from minimax import (evaluation3, isMateScore, orderMovesWithFlips, searchStats, resetSearchStats, NULL_WINDOW,
+                     minimax as alphaBetaSearch, pvs)
+from transposition import TranspositionTable
+
+# Set in each worker process by initialiseWorker. The table holds scores from workerEvaluation only, and is replaced
+# when a task comes with a different evaluation function.
+workerBound = None
+workerTable = None
+workerEvaluation = None
+
+def initialiseWorker(sharedBound):
+    global workerBound, workerTable
+    workerBound = sharedBound
+    workerTable = TranspositionTable()
+
+def closePool(executor):
+    executor.shutdown()
+
+class BoundImproved(Exception):
+    # Raised in a worker's search when the shared bound has moved on from the one its window was set from.
+    pass
+
+def searchRootMove(board, depth, tile, move, flips, evaluation, algorithm):
+    """
+    Runs in a worker: plays one root move and searches it. Returns (move, value, nodes).
+
+    The search window is placed just outside the best value found so far (read from shared memory), so a move that
+    ties with the best is still given an exact value and the tie can be broken the same way as the serial search.
+    If the shared bound improves while the search is running, the search is restarted with the new window.
+    """
+    opponentTile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE
+    search = pvs if algorithm == 'pvs' else alphaBetaSearch
+    global workerTable, workerEvaluation
+    if evaluation != workerEvaluation:
+        workerTable = TranspositionTable()
+        workerEvaluation = evaluation
+    resetSearchStats()
+    workerTable.newSearch()
+    applyMove(board, tile, move, flips)
+    try:
+        while True:
+            bound = workerBound.value
+            alpha, beta = float("-inf"), float("inf")
+            if not isMateScore(bound):
+                if tile == WHITE_TILE:
+                    alpha = bound - NULL_WINDOW
+                else:
+                    beta = bound + NULL_WINDOW
+            def checkBound(bound=bound):
+                if workerBound.value != bound:
+                    raise BoundImproved()
+            minimax.boundCheck = checkBound
+            try:
+                # An interrupted search leaves its board part way through, so each attempt searches a copy.
+                value = search(copy.deepcopy(board), depth, opponentTile, alpha, beta, evaluation, workerTable)
+                break
+            except BoundImproved:
+                pass
+    finally:
+        minimax.boundCheck = None
+    return move, value, searchStats['nodes']
+
+class ParallelSearcher:
+    """
+    A pool of worker processes for searching root moves in parallel. Create one and reuse it for every move, since
+    starting the processes is slow; close it (or use it in a with statement) when finished. Workers keep their
+    transposition tables from move to move, and start new ones when given a different evaluation function.
+    """
+    def __init__(self, workers=None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.sharedBound = multiprocessing.Value('d', 0.0)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=initialiseWorker,
+                                            initargs=(self.sharedBound,))
+        self.nodes = 0
+        # When made inside a worker process (e.g. by a tournament.py agent), shut the pool down when that process
+        # exits; multiprocessing would otherwise wait for the idle workers forever. The priority puts this ahead of
+        # the pool's own queue finalizers (priority 10), which would stop it from telling its workers to finish.
+        multiprocessing.util.Finalize(self, closePool, args=(self.executor,), exitpriority=100)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excInfo):
+        self.close()
+
+    def searchRoot(self, board, depth, tile, evaluation, algorithm='alphabeta'):
+        """
+        Same result as minimax.searchRoot(board, depth, tile, -inf, inf, evaluation, algorithm=algorithm): returns
+        (bestMove, value), with ties between root moves broken in favour of the one ordered first.
+        The number of nodes searched by all processes is left in self.nodes.
+        """
+        possibleMoves = orderMovesWithFlips(board, list(generateMovesWithFlips(board, tile)))
+        opponentTile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE
+        search = pvs if algorithm == 'pvs' else alphaBetaSearch
+
+        # The eldest brother is searched here with the full window before the others are started.
+        (x, y), flips = possibleMoves[0]
+        resetSearchStats()
+        searchBoard = copy.deepcopy(board)
+        applyMove(searchBoard, tile, (x, y), flips)
+        bestValue = search(searchBoard, depth, opponentTile, float("-inf"), float("inf"), evaluation)
+        self.nodes = searchStats['nodes']
+        values = {0: bestValue}
+        self.sharedBound.value = bestValue
+
+        futures = {}
+        for index, (move, flips) in enumerate(possibleMoves[1:], 1):
+            futures[self.executor.submit(searchRootMove, board, depth, tile, move, flips, evaluation, algorithm)] = index
+        for future in as_completed(futures):
+            move, value, nodes = future.result()
+            values[futures[future]] = value
+            self.nodes += nodes
+            if (value > bestValue) if tile == WHITE_TILE else (value < bestValue):
+                bestValue = value
+                self.sharedBound.value = bestValue
+
+        # The first move in the order with the best value, as in the serial search.
+        for index in range(len(possibleMoves)):
+            if values[index] == bestValue:
+                return list(possibleMoves[index][0]), bestValue
+
+    def move(self, board, depth, tile, evaluation, algorithm='alphabeta'):
+        # Drop-in for minimaxMove(board, depth, tile, -inf, inf, evaluation): returns the best move as [x, y].
+        return self.searchRoot(board, depth, tile, evaluation, algorithm)[0]
+
+def benchmark(positions, depth, maxWorkers, algorithm='alphabeta', evaluation=evaluation3):
+    """
+    Searches each (board, tile) position at a fixed depth serially and then with 1..maxWorkers workers, checking the
+    parallel results against the serial ones. Returns a list of result dicts, one per worker count (0 is serial).
+
+    The serial search uses the full window at every root move and no table, so it isn't a fair reference for the
+    speedup; speedup and nodesRatio are relative to the run with one worker instead.
+    """
+    results = []
+    resetSearchStats()
+    start = time.time()
+    serial = [minimax.searchRoot(copy.deepcopy(board), depth, tile, float("-inf"), float("inf"), evaluation,
+                                 algorithm=algorithm) for board, tile in positions]
+    results.append({'workers': 0, 'seconds': time.time() - start, 'nodes': searchStats['nodes']})
+    for workers in range(1, maxWorkers + 1):
+        with ParallelSearcher(workers) as searcher:
+            searcher.searchRoot(positions[0][0], 0, positions[0][1], evaluation, algorithm) # start the processes
+            nodes = 0
+            start = time.time()
+            for (board, tile), expected in zip(positions, serial):
+                result = searcher.searchRoot(board, depth, tile, evaluation, algorithm)
+                nodes += searcher.nodes
+                if result != expected:
+                    raise Exception("Parallel search result %s differs from serial result %s." % (result, expected))
+            seconds = time.time() - start
+        if workers == 1:
+            oneWorkerSeconds, oneWorkerNodes = seconds, nodes
+        results.append({'workers': workers, 'seconds': seconds, 'nodes': nodes,
+                        'speedup': oneWorkerSeconds / seconds, 'nodesRatio': nodes / oneWorkerNodes})
+    return results
+
+def benchmarkPositions(count):
+    # Midgame positions for the benchmark: the positions after 10, 14, 18, ... moves of a fixed game in which both
+    # players always play their first legal move in board order.
+    board = getNewBoard()
+    resetBoard(board)
+    tile = BLACK_TILE
+    positions = []
+    numMoves = 0
+    while len(positions) < count:
+        if not getValidMoves(board, tile):
+            tile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE
+            if not getValidMoves(board, tile):
+                break
+        if numMoves >= 10 and numMoves % 4 == 2:
+            positions.append((copy.deepcopy(board), tile))
+        x, y = sorted(getValidMoves(board, tile))[0]
+        makeMove(board, tile, x, y)
+        tile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE
+        numMoves += 1
+    return positions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark parallel root search against the serial search.')
+    parser.add_argument('--depth', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--positions', type=int, default=6)
+    parser.add_argument('--algorithm', default='alphabeta', choices=['alphabeta', 'pvs'])
+    args = parser.parse_args()
+    for result in benchmark(benchmarkPositions(args.positions), args.depth, args.workers, args.algorithm):
+        print(json.dumps(result))
@@ -0,0 +1,124 @@
+# Perft: counts the leaf positions of the full game tree to a given depth, to check the move generator against known
+# counts and to time it. A pass counts as a ply, and a finished game counts as one leaf however deep it would have
+# gone, as in the usual Othello perft figures (4, 12, 56, 244, ... from the start position).
+#
+# Each run appends one JSON line per position and depth to --output, tagged with the git commit, so the speed of the
+# move generator can be followed from commit to commit.
+#
+# Usage: python perft.py [--depth 7] [--generator list|bitboard] [--position start ...] [--output perft.jsonl]
+
+import argparse, json, subprocess, sys, time
+from board_functions import *
+from bitboard import getMovesMask, getFlipsMask, iterSquares, popcount
+
+# Positions as 64 characters in square order (board[0][0], board[0][1], ..., board[7][7]): X black, O white, - empty.
+# The reference counts are for depths 1, 2, 3, ... The start position figures are the published ones; the others were
+# worked out with both the original list-based move generator and the bitboard one.
+PERFT_POSITIONS = [
+    ('start', '---------------------------OX------XO---------------------------', 'X',
+     [4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288, 24571284, 212258800]),
+    ('midgame20', '--O-------OO------OOO-----OXOOO----XXXO--XXXXXXO----X-------X---', 'X',
+     [12, 124, 1529, 17659, 224278]),
+    ('midgame34', '--OX-X-O--OOXXOX-OXXXOX---OXOO-X--OOXOO----XOXOO--XXXXX--X----O-', 'X',
+     [15, 159, 1986, 22781, 252127]),
+    ('endgame48', 'XOOOOXX-XOOOOOOOXOOOOOOXXOOOXOOXXOXOXOXXXXOXXXOXX-O-XO-X--------', 'X',
+     [10, 74, 528, 3530, 18543]),
+]
+
+def parsePosition(squares, toMove):
+    # Returns (board, tile) for a position string from PERFT_POSITIONS.
+    tiles = {'X': BLACK_TILE, 'O': WHITE_TILE, '-': EMPTY_SPACE}
+    board = [[tiles[squares[x*8 + y]] for y in range(8)] for x in range(8)]
+    return board, tiles[toMove]
+
+def perft(board, tile, depth):
+    # Leaf count using the list-of-lists board functions (getValidMoves, makeMove, unmakeMove).
+    if depth == 0:
+        return 1
+    otherTile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE
+    possibleMoves = getValidMoves(board, tile)
+    if not possibleMoves:
+        if not getValidMoves(board, otherTile):
+            return 1 # game over
+        return perft(board, otherTile, depth - 1) # pass
+    if depth == 1:
+        return len(possibleMoves)
+    nodes = 0
+    for x, y in possibleMoves:
+        undo = makeMove(board, tile, x, y)
+        nodes += perft(board, otherTile, depth - 1)
+        unmakeMove(board, undo)
+    return nodes
+
+def perftBitboard(own, opp, depth):
+    # The same count straight on bitboards (own is the player to move).
+    if depth == 0:
+        return 1
+    moves = getMovesMask(own, opp)
+    if not moves:
+        if not getMovesMask(opp, own):
+            return 1
+        return perftBitboard(opp, own, depth - 1)
+    if depth == 1:
+        return popcount(moves)
+    nodes = 0
+    for square in iterSquares(moves):
+        flips = getFlipsMask(own, opp, square)
+        nodes += perftBitboard(opp & ~flips, own | flips | (1 << square), depth - 1)
+    return nodes
+
+def gitCommit():
+    # The current commit, or None when not run from a git checkout.
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def runPerft(names, maxDepth, generator='list'):
+    """
+    Runs perft to depths 1..maxDepth on the named positions (all of them if names is empty) and returns a result dict
+    per position and depth, with the node count, whether it matches the reference (None if there isn't one) and the
+    nodes per second.
+    """
+    results = []
+    for name, squares, toMove, reference in PERFT_POSITIONS:
+        if names and name not in names:
+            continue
+        board, tile = parsePosition(squares, toMove)
+        own, opp = getOwnAndOpponentBitboards(board, tile)
+        for depth in range(1, maxDepth + 1):
+            start = time.perf_counter()
+            if generator == 'bitboard':
+                nodes = perftBitboard(own, opp, depth)
+            else:
+                nodes = perft(board, tile, depth)
+            seconds = time.perf_counter() - start
+            expected = reference[depth - 1] if depth <= len(reference) else None
+            results.append({'position': name, 'depth': depth, 'generator': generator, 'nodes': nodes,
+                            'expected': expected, 'ok': None if expected is None else nodes == expected,
+                            'seconds': seconds, 'nodesPerSecond': nodes / seconds if seconds else 0.0})
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Count and time move generation to a fixed depth.')
+    parser.add_argument('--depth', type=int, default=7)
+    parser.add_argument('--generator', default='list', choices=['list', 'bitboard'],
+                        help='board_functions on list-of-lists boards, or bitboard.py directly')
+    parser.add_argument('--position', action='append', default=[],
+                        choices=[name for name, squares, toMove, reference in PERFT_POSITIONS])
+    parser.add_argument('--output', help='append the results to this file as JSON lines')
+    args = parser.parse_args()
+    results = runPerft(args.position, args.depth, args.generator)
+    commit, timestamp = gitCommit(), time.strftime('%Y-%m-%dT%H:%M:%S')
+    for result in results:
+        print('%-10s depth %2d: %12d nodes %8s %10.0f nodes/s'
+              % (result['position'], result['depth'], result['nodes'],
+                 {True: 'ok', False: 'WRONG', None: ''}[result['ok']], result['nodesPerSecond']))
+    if args.output:
+        with open(args.output, 'a') as f:
+            for result in results:
+                result.update({'commit': commit, 'time': timestamp})
+                f.write(json.dumps(result) + '\n')
+    if any(result['ok'] is False for result in results):
+        sys.exit(1)
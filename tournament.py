@@ -0,0 +1,293 @@
+# Headless matches between two agents, without pygame and without flippy's thinking pauses. Games alternate colours
+# and are shared out between worker processes.
+#
+# Agents are given as strings:
+#   getComputerMove, random, roxanne, roxanne1 .. roxanne4, mindisc, maxdisc, scorediff   (the simple agents)
+#   minimax:EVALUATION:DEPTH[:ALGORITHM][:parallel[WORKERS]]
+#                                          e.g. minimax:evaluation3:3, minimax:evaluation5:4:pvs or
+#                                          minimax:evaluation3:5:parallel4 (root moves searched by 4 worker processes;
+#                                          plain 'parallel' uses one per CPU)
+#   mcts:SIMULATIONS[:C[:PLAYOUT]]         e.g. mcts:400 or mcts:200:2:Random
+#
+# Usage: python tournament.py AGENT_A AGENT_B [--games 100] [--workers N] [--seed 0] [--json results.json]
+#
+# With --sprt the match is a sequential probability ratio test instead: games are played in pairs with the colours
+# swapped and the same seed, and the match stops as soon as the results show that A is either elo1 stronger than B
+# (H1) or only elo0 (H0), with error rates alpha and beta. Finished pairs are saved to --state as the test runs, and
+# running the same command again carries on from there.
+#   python tournament.py minimax:evaluation5:2 minimax:evaluation3:2 --sprt --elo0 0 --elo1 20 --state test.json
+
+import argparse, copy, json, math, multiprocessing, os, random, time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from board_functions import *
+import simple_agents, minimax
+from mcts import MCTS
+
+SIMPLE_AGENTS = {'getComputerMove': getComputerMove,
+                 'random': simple_agents.getRandomComputerMove,
+                 'roxanne': simple_agents.getRoxanneMove,
+                 'roxanne1': simple_agents.getDynamicRoxanneMovev1,
+                 'roxanne2': simple_agents.getDynamicRoxanneMovev2,
+                 'roxanne3': simple_agents.getDynamicRoxanneMovev3,
+                 'roxanne4': simple_agents.getDynamicRoxanneMovev4,
+                 'mindisc': simple_agents.getMinDiscMove,
+                 'maxdisc': simple_agents.getMaxDiscMove,
+                 'scorediff': simple_agents.getBestScoreDiffMove}
+
+def makeAgent(spec):
+    """
+    Returns a function (board, tile) -> [x, y] for an agent string (see the top of this file).
+    """
+    parts = spec.split(':')
+    if parts[0] in SIMPLE_AGENTS and len(parts) == 1:
+        return SIMPLE_AGENTS[parts[0]]
+    if parts[0] == 'minimax' and len(parts) in (3, 4, 5):
+        evaluation = getattr(minimax, parts[1], None)
+        if not parts[1].startswith('evaluation') or evaluation is None:
+            raise Exception("Unknown evaluation function %r in agent %r." % (parts[1], spec))
+        depth = int(parts[2])
+        options = parts[3:]
+        parallel = None
+        if options and options[-1].startswith('parallel'):
+            parallel = int(options.pop()[len('parallel'):] or 0)
+        if len(options) > 1:
+            raise Exception("Invalid agent %r: only one algorithm can be given." % spec)
+        algorithm = options[0] if options else 'alphabeta'
+        if parallel is None:
+            return lambda board, tile: minimax.minimaxMove(board, depth, tile, float("-inf"), float("inf"), evaluation,
+                                                           algorithm=algorithm)
+        searchers = [] # the worker pool is only started when the agent first moves
+        def parallelMove(board, tile):
+            if not searchers:
+                from parallel_search import ParallelSearcher
+                searchers.append(ParallelSearcher(parallel or None))
+            return minimax.minimaxMove(board, depth, tile, float("-inf"), float("inf"), evaluation,
+                                       algorithm=algorithm, searcher=searchers[0])
+        return parallelMove
+    if parts[0] == 'mcts' and len(parts) in (2, 3, 4):
+        numSimulations = int(parts[1])
+        C = float(parts[2]) if len(parts) > 2 else 4
+        playout = parts[3] if len(parts) > 3 else 'DynamicRoxanne3'
+        return lambda board, tile: MCTS(board, tile, numSimulations, C, playout)
+    raise Exception("Invalid agent %r. Use one of %s, minimax:EVALUATION:DEPTH[:ALGORITHM][:parallel[WORKERS]] "
+                    "or mcts:SIMULATIONS[:C[:PLAYOUT]]." % (spec, ', '.join(SIMPLE_AGENTS)))
+
+# Agents already made in this process, by spec.
+agentCache = {}
+
+def getAgent(spec):
+    if spec not in agentCache:
+        agentCache[spec] = makeAgent(spec)
+    return agentCache[spec]
+
+def playGame(agentA, agentB, aIsBlack, seed):
+    """
+    Plays one game between two agent strings, black moving first. Returns a dict from A's point of view: 'result'
+    ('win', 'draw' or 'loss'), 'margin' (A's discs minus B's), and the number of moves and seconds spent by each agent.
+    """
+    random.seed(seed)
+    players = {BLACK_TILE: getAgent(agentA if aIsBlack else agentB), WHITE_TILE: getAgent(agentB if aIsBlack else agentA)}
+    aTile = BLACK_TILE if aIsBlack else WHITE_TILE
+    moves = {BLACK_TILE: 0, WHITE_TILE: 0}
+    seconds = {BLACK_TILE: 0.0, WHITE_TILE: 0.0}
+    board = getNewBoard()
+    resetBoard(board)
+    tile = BLACK_TILE
+    while True:
+        whiteMoves, blackMoves = getValidMovesForBothSides(board)
+        if not whiteMoves and not blackMoves:
+            break
+        if not (whiteMoves if tile == WHITE_TILE else blackMoves):
+            tile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE # pass
+            continue
+        start = time.perf_counter()
+        x, y = players[tile](copy.deepcopy(board), tile)
+        seconds[tile] += time.perf_counter() - start
+        moves[tile] += 1
+        if not makeMove(board, tile, x, y):
+            raise Exception("Agent %s played the illegal move %s." % (agentA if tile == aTile else agentB, [x, y]))
+        tile = BLACK_TILE if tile == WHITE_TILE else WHITE_TILE
+    scores = getScoreOfBoard(board)
+    bTile = WHITE_TILE if aIsBlack else BLACK_TILE
+    margin = scores[aTile] - scores[bTile]
+    return {'aIsBlack': aIsBlack,
+            'result': 'win' if margin > 0 else 'loss' if margin < 0 else 'draw',
+            'margin': margin,
+            'aMoves': moves[aTile], 'aSeconds': seconds[aTile],
+            'bMoves': moves[bTile], 'bSeconds': seconds[bTile]}
+
+def summarise(agentA, agentB, games):
+    # Adds up the results of games (dicts from playGame).
+    def perMove(seconds, moves):
+        return 1000 * seconds / moves if moves else 0.0
+    count = len(games)
+    results = [game['result'] for game in games]
+    aMoves, bMoves = sum(g['aMoves'] for g in games), sum(g['bMoves'] for g in games)
+    return {'agentA': agentA,
+            'agentB': agentB,
+            'games': count,
+            'wins': results.count('win'),
+            'draws': results.count('draw'),
+            'losses': results.count('loss'),
+            'score': (results.count('win') + 0.5 * results.count('draw')) / count if count else 0.0,
+            'meanMargin': sum(g['margin'] for g in games) / count if count else 0.0,
+            'aMsPerMove': perMove(sum(g['aSeconds'] for g in games), aMoves),
+            'bMsPerMove': perMove(sum(g['bSeconds'] for g in games), bMoves)}
+
+def playMatch(agentA, agentB, numGames, workers=None, seed=0):
+    """
+    Plays numGames games between two agent strings on a pool of worker processes, with A playing black in the even
+    numbered games and white in the odd ones. Returns (summary, list of game results).
+    """
+    makeAgent(agentA), makeAgent(agentB) # fail here rather than in a worker if a spec is wrong
+    rng = random.Random(seed)
+    seeds = [rng.getrandbits(32) for i in range(numGames)]
+    with ProcessPoolExecutor(max_workers=workers or multiprocessing.cpu_count()) as executor:
+        futures = [executor.submit(playGame, agentA, agentB, i % 2 == 0, seeds[i]) for i in range(numGames)]
+        games = [future.result() for future in futures]
+    return summarise(agentA, agentB, games), games
+
+def eloToScore(elo):
+    # Expected score of a player elo points stronger than the opponent.
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def sprtLLR(wins, draws, losses, elo0, elo1):
+    """
+    Log-likelihood ratio of H1 (A is elo1 stronger) against H0 (A is elo0 stronger), using the normal approximation to
+    the distribution of game scores. Half a game is added to each outcome so the variance is never zero.
+    """
+    wins, draws, losses = wins + 0.5, draws + 0.5, losses + 0.5
+    count = wins + draws + losses
+    score = (wins + 0.5 * draws) / count
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / count
+    score0, score1 = eloToScore(elo0), eloToScore(elo1)
+    return count * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+def sprtBounds(alpha, beta):
+    # (lower, upper) LLR bounds: H0 is accepted below the lower one and H1 above the upper one.
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+# Seconds between saves of the SPRT state while the test runs (it is also saved when the test stops).
+SAVE_INTERVAL = 1.0
+
+def pairSeed(seed, index):
+    # The seed of both games of pair number index, the same however the pairs are scheduled or resumed.
+    return random.Random('%d-%d' % (seed, index)).getrandbits(32)
+
+def loadSprtState(stateFile, settings):
+    # Returns the finished pairs {index: [game, game]} saved for these settings, or {} to start afresh.
+    if stateFile is None or not os.path.exists(stateFile):
+        return {}
+    with open(stateFile) as f:
+        state = json.load(f)
+    if state['settings'] != settings:
+        raise Exception("%s holds a test with different settings; delete it or use another --state file." % stateFile)
+    return {int(index): games for index, games in state['pairs'].items()}
+
+def saveSprtState(stateFile, settings, pairs):
+    # Written to a temporary file first so an interruption can't leave a half-written state.
+    if stateFile is None:
+        return
+    with open(stateFile + '.tmp', 'w') as f:
+        json.dump({'settings': settings, 'pairs': pairs}, f)
+    os.replace(stateFile + '.tmp', stateFile)
+
+def runSprt(agentA, agentB, elo0=0, elo1=10, alpha=0.05, beta=0.05, maxGames=20000, workers=None, seed=0,
+            stateFile=None):
+    """
+    Plays colour-swapped pairs of games between two agent strings until the SPRT accepts H0 or H1, or maxGames have
+    been played. Returns (summary, list of game results); the summary also has 'llr', 'bounds' and 'decision' ('H0',
+    'H1' or 'inconclusive').
+    """
+    makeAgent(agentA), makeAgent(agentB)
+    settings = {'agentA': agentA, 'agentB': agentB, 'elo0': elo0, 'elo1': elo1, 'alpha': alpha, 'beta': beta,
+                'seed': seed}
+    lower, upper = sprtBounds(alpha, beta)
+    pairs = loadSprtState(stateFile, settings)
+    workers = workers or multiprocessing.cpu_count()
+    maxPairs = maxGames // 2
+
+    def decision():
+        games = [game for pair in pairs.values() for game in pair]
+        results = [game['result'] for game in games]
+        llr = sprtLLR(results.count('win'), results.count('draw'), results.count('loss'), elo0, elo1)
+        if llr >= upper:
+            return 'H1', llr
+        if llr <= lower:
+            return 'H0', llr
+        return None, llr
+
+    verdict, llr = decision()
+    nextPair = 0
+    executor = ProcessPoolExecutor(max_workers=workers)
+    running = {} # future -> (pair index, game number in the pair)
+    partial = {} # pair index -> {game number: result}
+    lastSave = time.time()
+    try:
+        while verdict is None:
+            # Keep every worker busy with at least one game queued behind it.
+            while len(running) < 2 * workers:
+                while nextPair in pairs:
+                    nextPair += 1
+                if nextPair >= maxPairs:
+                    break
+                for game in (0, 1):
+                    future = executor.submit(playGame, agentA, agentB, game == 0, pairSeed(seed, nextPair))
+                    running[future] = (nextPair, game)
+                nextPair += 1
+            if not running:
+                verdict = 'inconclusive'
+                break
+            done, notDone = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, game = running.pop(future)
+                partial.setdefault(index, {})[game] = future.result()
+                if len(partial[index]) == 2:
+                    pairs[index] = [partial[index][0], partial[index][1]]
+                    del partial[index]
+            if time.time() - lastSave >= SAVE_INTERVAL:
+                saveSprtState(stateFile, settings, pairs)
+                lastSave = time.time()
+            verdict, llr = decision()
+    finally:
+        # Don't wait for the games still running when the test is decided or interrupted; the finished pairs are saved.
+        saveSprtState(stateFile, settings, pairs)
+        executor.shutdown(wait=False, cancel_futures=True)
+    games = [game for index in sorted(pairs) for game in pairs[index]]
+    summary = summarise(agentA, agentB, games)
+    summary.update({'llr': llr, 'bounds': [lower, upper], 'decision': verdict})
+    return summary, games
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play a match between two agents without the GUI.')
+    parser.add_argument('agentA')
+    parser.add_argument('agentB')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the summary and every game result to this file')
+    parser.add_argument('--sprt', action='store_true', help='stop as soon as an SPRT decides the match')
+    parser.add_argument('--elo0', type=float, default=0)
+    parser.add_argument('--elo1', type=float, default=10)
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--max-games', type=int, default=20000, help='give up on the SPRT after this many games')
+    parser.add_argument('--state', help='file to save SPRT results to and resume from')
+    args = parser.parse_args()
+    start = time.time()
+    if args.sprt:
+        summary, games = runSprt(args.agentA, args.agentB, args.elo0, args.elo1, args.alpha, args.beta,
+                                 args.max_games, args.workers, args.seed, args.state)
+        print('SPRT elo0=%g elo1=%g alpha=%g beta=%g: LLR %.2f in [%.2f, %.2f], decision %s'
+              % (args.elo0, args.elo1, args.alpha, args.beta, summary['llr'], summary['bounds'][0],
+                 summary['bounds'][1], summary['decision']))
+    else:
+        summary, games = playMatch(args.agentA, args.agentB, args.games, args.workers, args.seed)
+    print('%s vs %s: %d games, +%d =%d -%d (score %.1f%%), mean disc margin %+.1f'
+          % (args.agentA, args.agentB, summary['games'], summary['wins'], summary['draws'], summary['losses'],
+             100 * summary['score'], summary['meanMargin']))
+    print('%.1f ms per move for %s, %.1f ms per move for %s; %.1f s in total'
+          % (summary['aMsPerMove'], args.agentA, summary['bMsPerMove'], args.agentB, time.time() - start))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summary, 'games': games}, f, indent=1)
@@ -0,0 +1,127 @@
+# Zobrist hashing and a transposition table for the minimax search in minimax.py.
+# The hash of a position is the XOR of one random number per (colour, square) occupied plus one for the side to move.
+# Making a move only changes the placed square and the flipped squares, so the hash of a child can be worked out from
+# the hash of its parent with a handful of XORs instead of rehashing the board.
+
+import random
+from board_functions import WHITE_TILE, BLACK_TILE, boardToBitboards, iterSquares
+
+# Fixed seed so that hashes are the same from run to run, which makes node counts reproducible.
+_zobristRandom = random.Random(20210501)
+ZOBRIST_SQUARES = {WHITE_TILE: [[_zobristRandom.getrandbits(64) for y in range(8)] for x in range(8)],
+                   BLACK_TILE: [[_zobristRandom.getrandbits(64) for y in range(8)] for x in range(8)]}
+ZOBRIST_WHITE_TO_MOVE = _zobristRandom.getrandbits(64)
+
+# Bound types stored with each score.
+EXACT = 0 # the score is the exact minimax value
+LOWER = 1 # the search failed high, the true value is at least the score
+UPPER = 2 # the search failed low, the true value is at most the score
+
+# Rough size of one table entry (the slot plus the entry tuple and its contents) used to turn a memory budget into a
+# number of slots.
+BYTES_PER_ENTRY = 150
+
+def computeHash(board, tile):
+    # Hashes a position from scratch. tile is the side to move.
+    white, black = boardToBitboards(board)
+    key = ZOBRIST_WHITE_TO_MOVE if tile == WHITE_TILE else 0
+    whiteKeys = ZOBRIST_SQUARES[WHITE_TILE]
+    blackKeys = ZOBRIST_SQUARES[BLACK_TILE]
+    for square in iterSquares(white):
+        key ^= whiteKeys[square >> 3][square & 7]
+    for square in iterSquares(black):
+        key ^= blackKeys[square >> 3][square & 7]
+    return key
+
+def hashAfterMove(key, tile, move, flippedTiles):
+    # Returns the hash of the position reached when 'tile' plays 'move' flipping 'flippedTiles', with the opponent to
+    # move next.
+    ownKeys = ZOBRIST_SQUARES[tile]
+    oppKeys = ZOBRIST_SQUARES[BLACK_TILE if tile == WHITE_TILE else WHITE_TILE]
+    key ^= ownKeys[move[0]][move[1]] ^ ZOBRIST_WHITE_TO_MOVE
+    for x, y in flippedTiles:
+        key ^= ownKeys[x][y] ^ oppKeys[x][y]
+    return key
+
+def hashAfterPass(key):
+    # Returns the hash of the same position with the other player to move.
+    return key ^ ZOBRIST_WHITE_TO_MOVE
+
+class TranspositionTable:
+    """
+    A fixed-size hash table of search results. Each slot holds (key, depth, bound, score, bestMove, generation).
+    The table never grows past the number of slots worked out from sizeMB (or given as maxEntries), so the memory used
+    is capped.
+
+    Replacement policy: a new result goes into its slot if the slot is empty, holds the same position, was stored
+    during an earlier search (see newSearch), or was searched to a depth no greater than the new one. Otherwise the
+    deeper, current result is kept.
+
+    Scores depend on the evaluation function, so use one table per evaluation function.
+    """
+    def __init__(self, sizeMB=16, maxEntries=None):
+        if maxEntries is None:
+            maxEntries = sizeMB * 1024 * 1024 // BYTES_PER_ENTRY
+        # Round down to a power of two so the slot can be taken from the low bits of the key.
+        numSlots = 1
+        while numSlots * 2 <= maxEntries:
+            numSlots *= 2
+        self.mask = numSlots - 1
+        self.slots = [None] * numSlots
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+        self.rejected = 0
+
+    def newSearch(self):
+        # Marks the start of a new search so results from previous moves are replaced first.
+        self.generation += 1
+
+    def probe(self, key):
+        # Returns (depth, bound, score, bestMove) for the position, or None if it isn't in the table.
+        entry = self.slots[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1:5]
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, bestMove):
+        index = key & self.mask
+        entry = self.slots[index]
+        if entry is not None and entry[0] != key:
+            if entry[5] == self.generation and entry[1] > depth:
+                self.rejected += 1
+                return
+            self.overwrites += 1
+        self.slots[index] = (key, depth, bound, score, bestMove, self.generation)
+        self.stores += 1
+
+    def clear(self):
+        self.slots = [None] * len(self.slots)
+        self.generation = 0
+        self.resetStats()
+
+    def resetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+        self.rejected = 0
+
+    def hitRate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def stats(self):
+        # Counters for reporting, e.g. print(table.stats()).
+        return {'slots': len(self.slots),
+                'used': sum(1 for entry in self.slots if entry is not None),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRate': self.hitRate(),
+                'stores': self.stores,
+                'overwrites': self.overwrites,
+                'rejected': self.rejected}
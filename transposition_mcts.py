@@ -0,0 +1,169 @@
+# MCTS over a directed acyclic graph instead of a tree: nodes are kept in a hash table keyed by position and side to
+# move, so a position reached by different move orders is a single node whose statistics are shared by every path to
+# it. Othello can't repeat a position (every move adds a disc, and two passes in a row end the game), so the graph has
+# no cycles.
+#
+# A node can have several parents, so results are backed up along the path taken by the simulation rather than
+# through parent pointers: every node on the path gets the result, whichever parent led to it.
+#
+# Run this file to see the transposition hit rate and memory saved, e.g. python transposition_mcts.py --simulations 2000
+
+import argparse, math, random, sys
+from board_functions import *
+from bitboard import getMovesMask, getFlipsMask, iterSquares, squareToCoords, popcount
+from mcts import Playout
+from endgame import ENDGAME_EMPTIES, countEmpties, endgameMove
+
+class DagNode:
+    """
+    A position in the graph. Values follow mcts.Node: the playouts won minus those lost by the player to move here.
+    """
+    __slots__ = ('white', 'black', 'whiteToMove', 'visits', 'value', 'children', 'untried', 'winner', 'parents')
+
+    def __init__(self, white, black, whiteToMove):
+        self.white = white
+        self.black = black
+        self.whiteToMove = whiteToMove
+        self.visits = 0
+        self.value = 0
+        self.children = None # {(x, y) or None for a pass: DagNode}, made when first visited
+        self.untried = None # [((x, y) or None, white, black, whiteToMove)] not yet linked to a child, in random order
+        self.winner = None # 'WHITE', 'BLACK' or 'TIE' if the game is over
+        self.parents = 0
+
+    def generateMoves(self):
+        # Works out the moves (or the pass) from this position once, leaving them shuffled in self.untried.
+        own, opp = (self.white, self.black) if self.whiteToMove else (self.black, self.white)
+        self.children = {}
+        self.untried = []
+        for square in iterSquares(getMovesMask(own, opp)):
+            flips = getFlipsMask(own, opp, square)
+            newOwn, newOpp = own | flips | (1 << square), opp & ~flips
+            white, black = (newOwn, newOpp) if self.whiteToMove else (newOpp, newOwn)
+            self.untried.append((squareToCoords(square), white, black, not self.whiteToMove))
+        if self.untried:
+            random.shuffle(self.untried)
+        elif getMovesMask(opp, own):
+            self.untried.append((None, self.white, self.black, not self.whiteToMove))
+        else:
+            numWhite, numBlack = popcount(self.white), popcount(self.black)
+            self.winner = 'WHITE' if numWhite > numBlack else 'BLACK' if numBlack > numWhite else 'TIE'
+
+class TranspositionMCTS:
+    """
+    An MCTS search graph for the given position and player to move, grown by calling run.
+    """
+    def __init__(self, board, tile, C=4, playout='DynamicRoxanne3'):
+        self.C = C
+        self.playout = playout
+        self.table = {}
+        self.lookups = 0
+        self.hits = 0
+        white, black = boardToBitboards(board)
+        self.root = self.getNode(white, black, tile == WHITE_TILE)
+
+    def getNode(self, white, black, whiteToMove):
+        # Returns the node for the position, making it if it isn't in the table yet.
+        key = (white, black, whiteToMove)
+        self.lookups += 1
+        node = self.table.get(key)
+        if node is None:
+            node = self.table[key] = DagNode(white, black, whiteToMove)
+        else:
+            self.hits += 1
+        return node
+
+    def expand(self, node):
+        # Links the next untried move to its child, which may already be in the graph through another path.
+        move, white, black, whiteToMove = node.untried.pop()
+        child = self.getNode(white, black, whiteToMove)
+        child.parents += 1
+        node.children[move] = child
+        return child
+
+    def select(self, node):
+        # Returns the child with the greatest UCB1 value, as in mcts.Node.ucb1.
+        logVisits = math.log(node.visits)
+        return max(node.children.values(),
+                   key=lambda child: -child.value/child.visits + self.C*math.sqrt(2 * logVisits / child.visits))
+
+    def simulate(self):
+        # One iteration: selection, expansion, playout, then backup along the path taken.
+        node = self.root
+        path = [node]
+        while True:
+            if node.children is None:
+                node.generateMoves()
+            if node.winner is not None:
+                break
+            if node.untried:
+                node = self.expand(node)
+                path.append(node)
+                break
+            node = self.select(node)
+            path.append(node)
+        if node.winner is not None:
+            winner = node.winner
+        else:
+            board = bitboardsToBoard(node.white, node.black)
+            winner = Playout(board, WHITE_TILE if node.whiteToMove else BLACK_TILE, self.playout)
+        whiteWon = winner == 'WHITE'
+        for node in path:
+            node.visits += 1
+            if winner != 'TIE':
+                node.value += 1 if node.whiteToMove == whiteWon else -1
+
+    def run(self, numSimulations):
+        for i in range(numSimulations):
+            self.simulate()
+
+    def bestMove(self):
+        # The move to the child with the lowest value, i.e. the best one for the player at the root.
+        return min((move for move in self.root.children if move is not None),
+                   key=lambda move: self.root.children[move].value)
+
+    def memoryPerNode(self):
+        # Rough bytes per node: the node itself, its children dict and untried list, and its two bitboards.
+        total = 0
+        for node in self.table.values():
+            total += sys.getsizeof(node) + sys.getsizeof(node.white) + sys.getsizeof(node.black)
+            if node.children is not None:
+                total += sys.getsizeof(node.children) + sys.getsizeof(node.untried)
+        return total / len(self.table)
+
+    def stats(self):
+        """
+        Transposition statistics. A plain tree has a separate node for every edge of the graph (plus the root), so
+        nodesSaved is how many nodes the plain tree would have made on top of these, without counting the duplicated
+        subtrees that would grow below them.
+        """
+        edges = sum(node.parents for node in self.table.values())
+        nodesSaved = edges + 1 - len(self.table)
+        return {'nodes': len(self.table),
+                'edges': edges,
+                'lookups': self.lookups,
+                'hits': self.hits,
+                'hitRate': self.hits / self.lookups if self.lookups else 0.0,
+                'nodesSaved': nodesSaved,
+                'memorySavedBytes': int(nodesSaved * self.memoryPerNode())}
+
+def transpositionMCTS(board, tile, numSimulations, C=4, playout='DynamicRoxanne3', endgameEmpties=ENDGAME_EMPTIES):
+    """
+    Same as mcts.MCTS(board, tile, numSimulations, C, playout, endgameEmpties), but sharing transposed positions.
+    """
+    if countEmpties(board) <= endgameEmpties:
+        return tuple(endgameMove(board, tile)[0])
+    search = TranspositionMCTS(board, tile, C, playout)
+    search.run(numSimulations)
+    return search.bestMove()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Transposition statistics of MCTS from the start position.')
+    parser.add_argument('--simulations', type=int, default=1000)
+    parser.add_argument('--playout', default='Random', choices=['DynamicRoxanne3', 'evaluation3', 'Random'])
+    args = parser.parse_args()
+    board = getNewBoard()
+    resetBoard(board)
+    search = TranspositionMCTS(board, BLACK_TILE, 4, args.playout)
+    search.run(args.simulations)
+    print(search.stats())